@@ -0,0 +1,175 @@
+import math
+from dataclasses import dataclass
+from itertools import combinations
+from itertools import islice
+
+import numpy as np
+import pandas as pd
+
+from app.bid_table import BidTable
+from app.categories import CATEGORIES
+
+# Up to this many supplier combinations the optimum is found by enumerating them, above it a greedy search is used
+EXACT_COMBINATIONS = 20_000
+COMBINATION_CHUNK = 512
+MAX_SWAP_ROUNDS = 20
+
+
+@dataclass
+class Assignment:
+    category: str
+    type_name: str
+    contractor: str
+    unit_price: float
+    quantity: float
+    lead_time: float
+    cost: float
+
+
+@dataclass
+class Award:
+    assignments: list[Assignment]
+    unawarded: list[tuple[str, str]]
+    suppliers: list[str]
+    total_cost: float
+    method: str
+
+
+def _score(costs: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Score the columns of an items × options cost matrix: number of uncovered items first, total cost second."""
+    uncovered = np.isinf(costs).sum(axis=0)
+    total = np.where(np.isinf(costs), 0.0, costs).sum(axis=0)
+    return uncovered, total
+
+
+def _best(uncovered: np.ndarray, total: np.ndarray) -> int:
+    return int(np.lexsort((total, uncovered))[0])
+
+
+def _exact_suppliers(cost: np.ndarray, candidates: np.ndarray, max_suppliers: int) -> list[int]:
+    best, best_key = None, None
+    combos = combinations(candidates.tolist(), max_suppliers)
+    while chunk := list(islice(combos, COMBINATION_CHUNK)):
+        chunk = np.asarray(chunk)
+        # items × combinations: the cost of every item when only the suppliers of a combination are used
+        uncovered, total = _score(cost[:, chunk].min(axis=2))
+        index = _best(uncovered, total)
+        if best_key is None or (uncovered[index], total[index]) < best_key:
+            best, best_key = chunk[index].tolist(), (uncovered[index], total[index])
+    return best
+
+
+def _greedy_suppliers(cost: np.ndarray, candidates: np.ndarray, max_suppliers: int) -> list[int]:
+    """Add the supplier that improves the award most until `max_suppliers`, then improve it with 1-for-1 swaps."""
+    chosen = []
+    current = np.full(cost.shape[0], np.inf)
+    for _ in range(max_suppliers):
+        options = np.setdiff1d(candidates, chosen)
+        index = _best(*_score(np.minimum(current[:, None], cost[:, options])))
+        chosen.append(int(options[index]))
+        current = np.minimum(current, cost[:, chosen[-1]])
+
+    best_key = tuple(value[0] for value in _score(current[:, None]))
+    for _ in range(MAX_SWAP_ROUNDS):
+        improved = False
+        for position in range(len(chosen)):
+            others = chosen[:position] + chosen[position + 1 :]
+            without = cost[:, others].min(axis=1) if others else np.full(cost.shape[0], np.inf)
+            options = np.setdiff1d(candidates, chosen)
+            if not len(options):
+                break
+            uncovered, total = _score(np.minimum(without[:, None], cost[:, options]))
+            index = _best(uncovered, total)
+            if (uncovered[index], total[index]) < best_key:
+                chosen[position] = int(options[index])
+                best_key = (uncovered[index], total[index])
+                improved = True
+        if not improved:
+            break
+    return chosen
+
+
+def award_bids(
+    bid_table: BidTable,
+    distances: dict[str, float] | None = None,
+    transport_cost_per_km: float = 0.0,
+    max_lead_time: float | None = None,
+    max_suppliers: int | None = None,
+    require_pre_cast: bool = False,
+) -> Award:
+    """
+    Award every (category, type) item of the bid table to the contractor that makes the total cost lowest.
+
+    The cost of a bid is its unit price times the model quantity plus the transport cost over the contractor's
+    distance (contractors without a location are charged no transport). Transport is charged per item: every type is
+    a separate delivery, so a contractor awarded three types is charged its distance three times, as the
+    per-delivery cost in the distances view. Bids over `max_lead_time`, without a price, or - with
+    `require_pre_cast` - without the pre-cast option in a category that offers it are not eligible. With
+    `max_suppliers` the items are awarded to at most that many contractors: exactly when the number of supplier
+    combinations is small enough to enumerate, greedily with swap improvements otherwise.
+    """
+    distances = distances or {}
+    # Items are (category, type) pairs, factorized through integer codes rather than tuples
+    category_codes, categories = pd.factorize(bid_table.category)
+    type_codes, types = pd.factorize(bid_table.type_name)
+    pair_codes = np.where((category_codes >= 0) & (type_codes >= 0), category_codes * len(types) + type_codes, -1)
+    item_codes, pairs = pd.factorize(pair_codes, use_na_sentinel=False)
+    valid_items = pairs >= 0
+    item_codes = np.where(valid_items[item_codes], np.cumsum(valid_items)[item_codes] - 1, -1)
+    pairs = pairs[valid_items]
+    items = list(zip(categories[pairs // len(types)], types[pairs % len(types)]))
+    contractor_codes, contractors = pd.factorize(bid_table.contractor)
+    distance = np.array([distances.get(contractor, 0.0) for contractor in contractors])[contractor_codes]
+    row_cost = bid_table.total + distance * transport_cost_per_km
+
+    eligible = (item_codes >= 0) & (contractor_codes >= 0) & ~np.isnan(row_cost)
+    if max_lead_time is not None:
+        eligible &= ~(bid_table.lead_time > max_lead_time)
+    if require_pre_cast:
+        pre_cast_categories = [category.name for category in CATEGORIES.values() if category.pre_cast]
+        eligible &= ~np.isin(bid_table.category, pre_cast_categories) | bid_table.pre_cast_option
+
+    # Cheapest eligible bid per item and contractor, should a contractor have bid twice on the same item
+    rows = np.flatnonzero(eligible)
+    rows = rows[np.argsort(row_cost[rows], kind="stable")]
+    cells = item_codes[rows] * len(contractors) + contractor_codes[rows]
+    _, first = np.unique(cells, return_index=True)
+    rows = rows[first]
+    cost = np.full((len(items), len(contractors)), np.inf)
+    cost[item_codes[rows], contractor_codes[rows]] = row_cost[rows]
+    best_row = np.full(cost.shape, -1)
+    best_row[item_codes[rows], contractor_codes[rows]] = rows
+
+    candidates = np.flatnonzero(np.isfinite(cost).any(axis=0))
+    if max_suppliers is None or max_suppliers >= len(candidates):
+        suppliers, method = candidates.tolist(), "exact"
+    elif math.comb(len(candidates), max_suppliers) <= EXACT_COMBINATIONS:
+        suppliers, method = _exact_suppliers(cost, candidates, max_suppliers), "exact"
+    else:
+        suppliers, method = _greedy_suppliers(cost, candidates, max_suppliers), "greedy"
+
+    awarded = np.asarray(suppliers, dtype=np.int64)[cost[:, suppliers].argmin(axis=1)] if suppliers else None
+    assignments, unawarded = [], []
+    for item, (category, type_name) in enumerate(items):
+        if awarded is None or np.isinf(cost[item, awarded[item]]):
+            unawarded.append((category, type_name))
+            continue
+        row = best_row[item, awarded[item]]
+        assignments.append(
+            Assignment(
+                category=category,
+                type_name=type_name,
+                contractor=contractors[awarded[item]],
+                unit_price=float(bid_table.unit_price[row]),
+                quantity=float(bid_table.quantity[row]),
+                lead_time=float(bid_table.lead_time[row]),
+                cost=float(cost[item, awarded[item]]),
+            )
+        )
+    return Award(
+        assignments=assignments,
+        unawarded=unawarded,
+        suppliers=sorted({assignment.contractor for assignment in assignments}),
+        total_cost=sum(assignment.cost for assignment in assignments),
+        method=method,
+    )
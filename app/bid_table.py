@@ -0,0 +1,90 @@
+from collections import defaultdict
+
+import numpy as np
+import pandas as pd
+
+from app.categories import CATEGORIES
+
+
+class BidTable:
+    """
+    Columnar table of every bid row of every contractor (child entity) of a project.
+
+    The table is built once per request from the children's saved params; each column is an array with one value per
+    bid row, and the chart matrices are pivoted from them without per-contractor Python loops.
+    """
+
+    def __init__(self, category, contractor, type_name, lead_time, unit_price, quantity, pre_cast_option):
+        self.category = np.asarray(category, dtype=object)
+        self.contractor = np.asarray(contractor, dtype=object)
+        self.type_name = np.asarray(type_name, dtype=object)
+        self.lead_time = np.asarray(lead_time, dtype=float)
+        self.unit_price = np.asarray(unit_price, dtype=float)
+        self.quantity = np.asarray(quantity, dtype=float)
+        self.pre_cast_option = np.asarray(pre_cast_option, dtype=bool)
+        self.total = self.unit_price * self.quantity
+
+    def __len__(self):
+        return len(self.category)
+
+    @classmethod
+    def from_children(cls, children, quantities: dict[str, pd.Series]) -> "BidTable":
+        """Collect the bid rows of all `children`, pricing them with the per-type `quantities` of each category."""
+        columns = defaultdict(list)
+        for child in children:
+            for category in CATEGORIES.values():
+                # Contractors that saved before a category was registered have no bid array for it
+                for row in child.last_saved_params.get(category.name) or []:
+                    columns["category"].append(category.name)
+                    columns["contractor"].append(child.name)
+                    columns["type_name"].append(row[category.type_field])
+                    columns["lead_time"].append(row.lead_time)
+                    columns["unit_price"].append(row.price_per_unit)
+                    columns["pre_cast_option"].append(bool(row.get("pre_cast_option")))
+        category = np.asarray(columns["category"], dtype=object)
+        type_name = np.asarray(columns["type_name"], dtype=object)
+        quantity = np.zeros(len(category))
+        for name, category_quantities in quantities.items():
+            mask = category == name
+            quantity[mask] = category_quantities.reindex(type_name[mask], fill_value=0.0).to_numpy(dtype=float)
+        return cls(
+            category,
+            columns["contractor"],
+            type_name,
+            columns["lead_time"],
+            columns["unit_price"],
+            quantity,
+            columns["pre_cast_option"],
+        )
+
+    def rows(self, category: str) -> np.ndarray:
+        return np.flatnonzero(self.category == category)
+
+    def pivot(self, category: str, value: str = "total") -> tuple[list, list, np.ndarray]:
+        """
+        Return the contractors, the types and a contractors × types matrix of `value` for one category.
+
+        Contractors and types are ordered by first appearance; a contractor that bid twice on a type keeps its last bid,
+        and types a contractor didn't bid on are 0.
+        """
+        rows = self.rows(category)
+        contractor_codes, contractors = pd.factorize(self.contractor[rows])
+        type_codes, types = pd.factorize(self.type_name[rows])
+        # Rows without a selected type (or contractor name) are left out of the chart
+        valid = (contractor_codes >= 0) & (type_codes >= 0)
+        rows, contractor_codes, type_codes = rows[valid], contractor_codes[valid], type_codes[valid]
+        cells = contractor_codes * len(types) + type_codes
+        # np.unique returns first occurrences, so search the reversed cells to keep the last bid per cell
+        _, last = np.unique(cells[::-1], return_index=True)
+        last = len(cells) - 1 - last
+        matrix = np.zeros((len(contractors), len(types)))
+        matrix[contractor_codes[last], type_codes[last]] = getattr(self, value)[rows][last]
+        return list(contractors), list(types), matrix
+
+    def prices_per_type(self, category: str) -> dict[str, dict[str, float]]:
+        """Unit price per contractor for each type, in the shape the prices are stored on the Speckle meshes."""
+        prices = defaultdict(dict)
+        for row in self.rows(category):
+            unit_price = self.unit_price[row]
+            prices[self.type_name[row]][self.contractor[row]] = None if np.isnan(unit_price) else float(unit_price)
+        return prices
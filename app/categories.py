@@ -0,0 +1,74 @@
+import json
+import os
+from dataclasses import dataclass
+
+# Quantity attribute of the concrete meshes in the exported models
+VOLUME_FIELD = "Volume (m³)"
+# JSON list of extra categories, or overrides of the default ones by name, e.g. to add steel, glazing or MEP
+CATEGORIES_FILE = os.environ.get("MATERIAL_CATEGORIES_FILE")
+
+
+@dataclass(frozen=True)
+class MaterialCategory:
+    """
+    A material category bid on in the app.
+
+    Each category is a branch of the Speckle stream whose commits hold the elements under `member`, a DynamicArray of
+    bids on the contractor entities and a chart on the project. Elements are summed by their `quantity_field`, or
+    counted when it is None.
+    """
+
+    name: str
+    label: str
+    member: str
+    unit: str
+    price_suffix: str
+    quantity_field: str | None = None
+    pre_cast: bool = False
+    ifc_classes: tuple[str, ...] = ()
+    ifc_material: str | None = None
+
+    @property
+    def quantity(self) -> str:
+        return "volume" if self.quantity_field else "count"
+
+    @property
+    def type_field(self) -> str:
+        """Field of a bid row holding the selected type, e.g. `concrete_type`."""
+        return f"{self.name}_type"
+
+
+DEFAULT_CATEGORIES = (
+    MaterialCategory(
+        name="concrete",
+        label="Concrete",
+        member="@Concrete",
+        unit="m³",
+        price_suffix="€ / m³",
+        quantity_field=VOLUME_FIELD,
+        pre_cast=True,
+        ifc_classes=("IfcBeam", "IfcColumn", "IfcFooting", "IfcMember", "IfcPile", "IfcSlab", "IfcStair", "IfcWall"),
+        ifc_material="concrete",
+    ),
+    MaterialCategory(
+        name="lighting",
+        label="Lighting",
+        member="@Lighting",
+        unit="pieces",
+        price_suffix="€",
+        ifc_classes=("IfcLightFixture",),
+    ),
+)
+
+
+def load_categories(path: str | None = None) -> dict[str, MaterialCategory]:
+    categories = {category.name: category for category in DEFAULT_CATEGORIES}
+    if path:
+        with open(path, encoding="utf-8") as file:
+            for entry in json.load(file):
+                entry["ifc_classes"] = tuple(entry.get("ifc_classes", ()))
+                categories[entry["name"]] = MaterialCategory(**entry)
+    return categories
+
+
+CATEGORIES = load_categories(CATEGORIES_FILE)
@@ -0,0 +1,50 @@
+import contextvars
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any
+from typing import Callable
+
+from app.telemetry import telemetry
+
+MAX_WORKERS = int(os.environ.get("APP_MAX_WORKERS", 8))
+
+logger = logging.getLogger(__name__)
+
+_executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="app-io")
+
+
+def _timed(name: str, operation: Callable[[], Any]) -> tuple[Any, float]:
+    start = time.perf_counter()
+    with telemetry.span(f"concurrent.{name}"):
+        result = operation()
+    return result, time.perf_counter() - start
+
+
+def run_concurrently(operations: dict[str, Callable[[], Any]]) -> tuple[dict[str, Any], dict[str, float]]:
+    """
+    Run independent, network bound operations side by side on the shared thread pool.
+
+    Every operation runs in a copy of the caller's context, so request-scoped state, like the current telemetry span,
+    is still visible to it; each is timed in a span of its own. Returns the results and the duration in seconds of each
+    operation, both keyed like `operations`. The first exception raised by an operation is re-raised once all
+    operations have finished.
+
+    Operations must not call `run_concurrently` themselves: nested calls compete for the same bounded pool.
+    """
+    futures = {
+        name: _executor.submit(contextvars.copy_context().run, _timed, name, operation)
+        for name, operation in operations.items()
+    }
+    results, timings, error = {}, {}, None
+    for name, future in futures.items():
+        try:
+            results[name], timings[name] = future.result()
+        except Exception as exception:
+            error = error or exception
+    if error is not None:
+        raise error
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("timings: %s", ", ".join(f"{name} {duration * 1000:.0f} ms" for name, duration in timings.items()))
+    return results, timings
@@ -0,0 +1,76 @@
+import numpy as np
+
+# Radius of the Earth in kilometers
+EARTH_RADIUS_KM = 6371.0
+
+
+def haversine_km(lat1, lon1, lat2, lon2) -> np.ndarray:
+    """
+    Haversine distance in kilometers between points given in decimal degrees.
+
+    The arguments broadcast like NumPy arrays, so e.g. `haversine_km(sites_lat[:, None], sites_lon[:, None], lat, lon)`
+    computes the sites × points distance matrix in one call.
+    """
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(value, dtype=float)) for value in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+class ContractorIndex:
+    """
+    Contractor locations sorted by latitude.
+
+    A radius query only has to compute distances for the contractors within the latitude band the radius spans, found
+    with a binary search, which keeps filtering thousands of contractors against many sites cheap.
+    """
+
+    def __init__(self, names, lats, lons):
+        order = np.argsort(np.asarray(lats, dtype=float), kind="stable")
+        self.names = np.asarray(names, dtype=object)[order]
+        self.lats = np.asarray(lats, dtype=float)[order]
+        self.lons = np.asarray(lons, dtype=float)[order]
+
+    def __len__(self):
+        return len(self.names)
+
+    @classmethod
+    def from_children(cls, children) -> "ContractorIndex":
+        """Index the contractor children that filled in their location."""
+        located = [
+            (child.name, child.last_saved_params.constructor_location)
+            for child in children
+            if child.last_saved_params.get("constructor_location")
+        ]
+        return cls(
+            [name for name, _ in located],
+            [location.lat for _, location in located],
+            [location.lon for _, location in located],
+        )
+
+    def distances(self, site_lats, site_lons) -> np.ndarray:
+        """Sites × contractors matrix of distances in kilometers, in the order of `names`."""
+        site_lats = np.atleast_1d(np.asarray(site_lats, dtype=float))
+        site_lons = np.atleast_1d(np.asarray(site_lons, dtype=float))
+        return haversine_km(site_lats[:, None], site_lons[:, None], self.lats[None, :], self.lons[None, :])
+
+    def within(self, lat: float, lon: float, radius_km: float) -> tuple[np.ndarray, np.ndarray]:
+        """Return the positions and distances of the contractors within `radius_km` of a site, nearest first."""
+        band = np.degrees(radius_km / EARTH_RADIUS_KM)
+        start = np.searchsorted(self.lats, lat - band, side="left")
+        stop = np.searchsorted(self.lats, lat + band, side="right")
+        distances = haversine_km(lat, lon, self.lats[start:stop], self.lons[start:stop])
+        inside = np.flatnonzero(distances <= radius_km)
+        order = np.argsort(distances[inside], kind="stable")
+        return start + inside[order], distances[inside][order]
+
+    def nearest(self, lat: float, lon: float, k: int | None = None, radius_km: float | None = None) -> list:
+        """Return `(name, distance in km)` of the `k` nearest contractors to a site, optionally within a radius."""
+        if radius_km is not None:
+            positions, distances = self.within(lat, lon, radius_km)
+        else:
+            distances = haversine_km(lat, lon, self.lats, self.lons)
+            positions = np.argsort(distances, kind="stable")
+            distances = distances[positions]
+        if k is not None:
+            positions, distances = positions[:k], distances[:k]
+        return list(zip(self.names[positions].tolist(), distances.tolist()))
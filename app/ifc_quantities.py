@@ -0,0 +1,107 @@
+import multiprocessing
+import os
+
+import ifcopenshell
+import ifcopenshell.geom
+import ifcopenshell.util.element
+import numpy as np
+
+from app.categories import CATEGORIES
+from app.model_snapshot import ModelSnapshot
+from app.speckle_cache import LRUCache
+
+VOLUME_QUANTITIES = ("NetVolume", "GrossVolume")
+IFC_THREADS = int(os.environ.get("IFC_THREADS", multiprocessing.cpu_count()))
+
+ifc_snapshots = LRUCache(8)
+
+
+def ifc_version(path: str) -> str:
+    """Identify a revision of an IFC file, the way an object id identifies a Speckle commit."""
+    stat = os.stat(path)
+    return f"ifc:{os.path.abspath(path)}:{stat.st_mtime_ns}:{stat.st_size}"
+
+
+def ifc_type_name(element) -> str:
+    element_type = ifcopenshell.util.element.get_type(element)
+    return (element_type.Name if element_type else None) or element.ObjectType or element.Name or element.is_a()
+
+
+def has_material(element, keyword: str) -> bool:
+    return any(
+        keyword in (material.Name or "").lower() for material in ifcopenshell.util.element.get_materials(element)
+    )
+
+
+def quantity_volume(element) -> float | None:
+    """Read the volume from the element's base quantities, if the exporter wrote them."""
+    for quantities in ifcopenshell.util.element.get_psets(element, qtos_only=True).values():
+        for name in VOLUME_QUANTITIES:
+            if quantities.get(name):
+                return float(quantities[name])
+    return None
+
+
+def mesh_volume(verts, faces) -> float:
+    """Volume enclosed by a closed triangle mesh: the sum of the signed volumes of the tetrahedra to the origin."""
+    vertices = np.asarray(verts, dtype=float).reshape(-1, 3)
+    triangles = vertices[np.asarray(faces, dtype=np.int64).reshape(-1, 3)]
+    return abs(np.einsum("ij,ij->i", triangles[:, 0], np.cross(triangles[:, 1], triangles[:, 2])).sum()) / 6
+
+
+def geometry_volumes(ifc_file, elements: list, num_threads: int = IFC_THREADS) -> dict[int, float]:
+    """Tessellate `elements` on `num_threads` native threads and return their mesh volume by element id."""
+    settings = ifcopenshell.geom.settings()
+    iterator = ifcopenshell.geom.iterator(settings, ifc_file, num_threads, include=elements)
+    volumes = {}
+    if iterator.initialize():
+        while True:
+            shape = iterator.get()
+            volumes[shape.id] = mesh_volume(shape.geometry.verts, shape.geometry.faces)
+            if not iterator.next():
+                break
+    return volumes
+
+
+def take_off(ifc_file, category_name: str, version: str, num_threads: int = IFC_THREADS) -> ModelSnapshot:
+    """
+    Take the quantities of one category off an IFC model, into the same table the Speckle commits are read into.
+
+    Elements are named after their type, like the meshes of the Speckle commits. The IFC classes and material are read
+    from the category registry. Volumes come from the base quantities where available; only elements without them are
+    tessellated, in parallel.
+    """
+    category = CATEGORIES[category_name]
+    elements = []
+    for ifc_class in category.ifc_classes:
+        try:
+            elements.extend(ifc_file.by_type(ifc_class))
+        except RuntimeError:
+            # The class doesn't exist in the schema of this file, e.g. IfcLightFixture in IFC2X3
+            continue
+    if category.ifc_material is not None:
+        elements = [element for element in elements if has_material(element, category.ifc_material)]
+
+    volumes = {}
+    if category.quantity == "volume":
+        volumes = {element.id(): quantity_volume(element) for element in elements}
+        without_quantities = [element for element in elements if volumes[element.id()] is None]
+        if without_quantities:
+            volumes.update(geometry_volumes(ifc_file, without_quantities, num_threads))
+    return ModelSnapshot(
+        version,
+        [ifc_type_name(element) for element in elements],
+        [volumes.get(element.id()) or 0.0 for element in elements],
+        np.ones(len(elements), dtype=np.int64),
+        [element.GlobalId for element in elements],
+    )
+
+
+def get_ifc_snapshot(path: str, category: str) -> ModelSnapshot:
+    """Take off a category of the IFC file at `path`, cached until the file changes."""
+    version = ifc_version(path)
+    snapshot = ifc_snapshots.get((version, category))
+    if snapshot is None:
+        snapshot = take_off(ifcopenshell.open(path), category, version)
+        ifc_snapshots.put((version, category), snapshot)
+    return snapshot
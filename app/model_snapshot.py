@@ -0,0 +1,66 @@
+from typing import Iterable
+
+import numpy as np
+import pandas as pd
+
+from app.categories import VOLUME_FIELD
+
+
+def _sum_codes(codes: np.ndarray, uniques: np.ndarray, values) -> pd.Series:
+    """
+    Sum `values` per factorized name in a single `np.bincount`, so time and memory grow with the number of elements
+    only, not with elements × types.
+    """
+    values = np.asarray(values, dtype=float)
+    valid = codes >= 0
+    totals = np.bincount(codes[valid], weights=values[valid], minlength=len(uniques))
+    return pd.Series(totals, index=pd.Index(uniques, dtype=object), dtype=float)
+
+
+class ModelSnapshot:
+    """
+    Columnar table of the elements in one commit of a category branch (e.g. the `@Concrete` or `@Lighting` object).
+
+    The elements are read once when the snapshot is built; type names, per-type totals and element lookups are
+    then all served from the `names`, `volumes`, `counts` and `element_ids` columns. `volumes` holds the quantity
+    field of the category, whichever it is.
+    """
+
+    def __init__(self, object_id: str, names, volumes, counts, element_ids):
+        self.object_id = object_id
+        self.names = np.asarray(names, dtype=object)
+        self.volumes = np.asarray(volumes, dtype=float)
+        self.counts = np.asarray(counts, dtype=np.int64)
+        self.element_ids = np.asarray(element_ids, dtype=object)
+        self.codes, self.types = pd.factorize(self.names)
+
+    def __len__(self):
+        return len(self.names)
+
+    @classmethod
+    def from_objects(
+        cls, object_id: str, elements: Iterable[dict], quantity_field: str | None = VOLUME_FIELD
+    ) -> "ModelSnapshot":
+        """Build the columns in one pass over serialized elements, e.g. as streamed by `iter_serialized_objects`."""
+        names, volumes, element_ids = [], [], []
+        for element in elements:
+            names.append(element["Name"])
+            volumes.append(element.get(quantity_field, 0.0) if quantity_field else 0.0)
+            # The application id survives a change of the element's attributes, e.g. its prices; the object id doesn't
+            element_ids.append(element.get("applicationId") or element.get("id"))
+        return cls(object_id, names, volumes, np.ones(len(names), dtype=np.int64), element_ids)
+
+    def type_names(self) -> list[str]:
+        return sorted(self.types)
+
+    @classmethod
+    def empty(cls, object_id: str = "") -> "ModelSnapshot":
+        return cls(object_id, [], [], [], [])
+
+    def totals(self, quantity: str = "volume") -> pd.Series:
+        """Sum the `volume` or `count` column per type name."""
+        column = self.volumes if quantity == "volume" else self.counts
+        return _sum_codes(self.codes, self.types, column)
+
+    def elements(self, name: str) -> list:
+        return self.element_ids[self.names == name].tolist()
@@ -1,4 +1,4 @@
-import math
+from functools import partial
 
 from viktor import ViktorController
 from viktor.parametrization import BooleanField
@@ -16,10 +16,12 @@ from viktor.views import MapAndDataResult
 from viktor.views import MapAndDataView
 from viktor.views import MapPoint
 
-from app.speckle_functions import get_speckle_concrete_names
-from app.speckle_functions import get_speckle_concrete_volume_dataframe
-from app.speckle_functions import get_speckle_lighting_dataframe
-from app.speckle_functions import get_speckle_lighting_names
+from app.categories import CATEGORIES
+from app.categories import MaterialCategory
+from app.geo import haversine_km
+from app.speckle_functions import get_quantities
+from app.speckle_functions import get_type_names
+from app.telemetry import telemetry
 
 PROJECT_LOCATION = MapPoint(41.390608, 2.177505)
 
@@ -35,28 +37,7 @@ def haversine_distance(coord1, coord2):
     Returns:
         The distance in kilometers between the two coordinates.
     """
-    lat1, lon1 = coord1.lat, coord1.lon
-    lat2, lon2 = coord2.lat, coord2.lon
-
-    # Convert decimal degrees to radians
-    lat1_rad = math.radians(lat1)
-    lon1_rad = math.radians(lon1)
-    lat2_rad = math.radians(lat2)
-    lon2_rad = math.radians(lon2)
-
-    # Haversine formula
-    dlat = lat2_rad - lat1_rad
-    dlon = lon2_rad - lon1_rad
-
-    a = math.sin(dlat / 2) ** 2 + math.cos(lat1_rad) * math.cos(lat2_rad) * math.sin(dlon / 2) ** 2
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
-
-    # Radius of the Earth in kilometers
-    R = 6371
-
-    # Distance in kilometers
-    distance = R * c
-    return distance
+    return float(haversine_km(coord1.lat, coord1.lon, coord2.lat, coord2.lon))
 
 
 def get_distance_to_project_location(params, **kwargs):
@@ -65,28 +46,37 @@ def get_distance_to_project_location(params, **kwargs):
     return None
 
 
-class Parametrization(ViktorParametrization):
-    welcome = Text(
-        "Welcome to the open bidding application! Please start by filling in the location of your distribution"
-        " facility, and your distance to the project will be calculated. Then proceed by filling your price estimate "
-        "for each of the different items."
+def bid_fields(category: MaterialCategory) -> dict:
+    """Header and DynamicArray of the bids on one category, named after it so saved bids keep their fields."""
+    bids = DynamicArray(f"{category.label} bids")
+    if category.pre_cast:
+        bids.pre_cast_option = BooleanField("Pre-cast option")
+        bids.line_break = LineBreak()
+    setattr(
+        bids, category.type_field, OptionField(f"{category.label} type", options=partial(get_type_names, category.name))
     )
-    constructor_header = Text("# Location")
-    constructor_location = GeoPointField("Constructor location")
-    distance_to_project = OutputField("Distance to project", value=get_distance_to_project_location)
-    concrete_header = Text("# Concrete")
-    concrete = DynamicArray("Concrete bids")
-    concrete.pre_cast_option = BooleanField("Pre-cast option")
-    concrete.line_break = LineBreak()
-    concrete.concrete_type = OptionField("Concrete type", options=get_speckle_concrete_names())
-    concrete.lead_time = NumberField("Lead time", suffix="weeks")
-    concrete.price_per_unit = NumberField("Price per m³", suffix="€ / m³")
-    line_break = LineBreak()
-    lighting_header = Text("# Lighting")
-    lighting = DynamicArray("Lighting bids")
-    lighting.lighting_type = OptionField("Lighting type", options=get_speckle_lighting_names())
-    lighting.lead_time = NumberField("Lead time", suffix="weeks")
-    lighting.price_per_unit = NumberField("Price per piece", suffix="€")
+    bids.lead_time = NumberField("Lead time", suffix="weeks")
+    unit = "piece" if category.quantity == "count" else category.unit
+    bids.price_per_unit = NumberField(f"Price per {unit}", suffix=category.price_suffix)
+    return {f"{category.name}_header": Text(f"# {category.label}"), category.name: bids}
+
+
+# The bid arrays follow the category registry, so the class is assembled rather than written out
+Parametrization = type(ViktorParametrization)(
+    "Parametrization",
+    (ViktorParametrization,),
+    {
+        "welcome": Text(
+            "Welcome to the open bidding application! Please start by filling in the location of your distribution"
+            " facility, and your distance to the project will be calculated. Then proceed by filling your price "
+            "estimate for each of the different items."
+        ),
+        "constructor_header": Text("# Location"),
+        "constructor_location": GeoPointField("Constructor location"),
+        "distance_to_project": OutputField("Distance to project", value=get_distance_to_project_location),
+        **{name: field for category in CATEGORIES.values() for name, field in bid_fields(category).items()},
+    },
+)
 
 
 class Controller(ViktorController):
@@ -94,31 +84,29 @@ class Controller(ViktorController):
     parametrization = Parametrization
 
     @MapAndDataView("Constructor location", duration_guess=1)
+    @telemetry.view
     def constructor_location(self, params, **kwargs):
         map_elements = [PROJECT_LOCATION]
         if params.constructor_location:
             map_elements.append(MapPoint.from_geo_point(params.constructor_location))
 
-        concrete_data = get_speckle_concrete_volume_dataframe()
-        lighting_data = get_speckle_lighting_dataframe()
+        quantities = get_quantities()
         return MapAndDataResult(
             features=map_elements,
             data=DataGroup(
-                DataItem(
-                    "Concrete",
-                    value=f"{concrete_data.sum():.0f}",
-                    suffix="m³",
-                    subgroup=DataGroup(
-                        *(DataItem(key, value=f"{value:.0f}", suffix="m³") for key, value in concrete_data.items())
-                    ),
-                ),
-                DataItem(
-                    "Lighting",
-                    value=f"{lighting_data.sum():.0f}",
-                    suffix="pieces",
-                    subgroup=DataGroup(
-                        *(DataItem(key, value=f"{value:.0f}", suffix="pieces") for key, value in lighting_data.items())
-                    ),
-                ),
+                *(
+                    DataItem(
+                        category.label,
+                        value=f"{quantities[name].sum():.0f}",
+                        suffix=category.unit,
+                        subgroup=DataGroup(
+                            *(
+                                DataItem(key, value=f"{value:.0f}", suffix=category.unit)
+                                for key, value in quantities[name].items()
+                            )
+                        ),
+                    )
+                    for name, category in CATEGORIES.items()
+                )
             ),
         )
@@ -1,18 +1,48 @@
-from collections import defaultdict
+from functools import partial
 
-import plotly.graph_objects as go
 from viktor import ViktorController
 from viktor.api_v1 import API
 from viktor.parametrization import ActionButton
+from viktor.parametrization import BooleanField
 from viktor.parametrization import ChildEntityManager
+from viktor.parametrization import DownloadButton
+from viktor.parametrization import NumberField
 from viktor.parametrization import Text
 from viktor.parametrization import ViktorParametrization
+from viktor.result import DownloadResult
+from viktor.views import DataGroup
+from viktor.views import DataItem
+from viktor.views import DataResult
+from viktor.views import DataView
 from viktor.views import PlotlyResult
 from viktor.views import PlotlyView
 
-from app.speckle_functions import get_speckle_concrete_volume_dataframe
-from app.speckle_functions import get_speckle_lighting_dataframe
+from app.award import award_bids
+from app.bid_table import BidTable
+from app.categories import CATEGORIES
+from app.concurrency import run_concurrently
+from app.geo import ContractorIndex
+from app.my_entity_type.controller import PROJECT_LOCATION
+from app.plotly_json import dumps
+from app.plotly_json import grouped_bar_subplots
+from app.speckle_functions import get_quantities
+from app.speckle_functions import get_quantity_versions
 from app.speckle_functions import push_prices_to_speckle
+from app.telemetry import telemetry
+from app.view_cache import view_result_key
+from app.view_cache import view_results
+
+# Maximum number of contractors listed in the distance ranking
+RANKING_SIZE = 50
+# VIKTOR rejects data groups with more items than this
+MAX_DATA_ITEMS = 100
+
+
+def split_data_items(items: list) -> tuple[list, list]:
+    """Split the items to list in a data group into the ones shown and the rest, summed up by one last data item."""
+    if len(items) <= MAX_DATA_ITEMS:
+        return items, []
+    return items[: MAX_DATA_ITEMS - 1], items[MAX_DATA_ITEMS - 1 :]
 
 
 class Parametrization(ViktorParametrization):
@@ -26,6 +56,29 @@ This app allows any contractor to bid for construction.
     )
     button = ActionButton("Update prices in model", method="push_prices_to_model")
     childs = ChildEntityManager("MyEntityType")
+    chart_top_n = NumberField(
+        "Contractors in chart",
+        min=1,
+        num_decimals=0,
+        description="Leave empty to chart every contractor; the others are shown as one bar of their mean bid",
+    )
+    distance_header = Text("# Contractor distances")
+    transport_cost_per_km = NumberField(
+        "Transport cost",
+        suffix="€ / km",
+        default=2,
+        description="Charged per delivery: every type awarded to a contractor is delivered, and charged, separately",
+    )
+    max_distance = NumberField("Maximum distance", suffix="km", description="Leave empty to rank all contractors")
+    award_header = Text("# Bid award")
+    max_lead_time = NumberField("Maximum lead time", suffix="weeks", description="Leave empty to accept any lead time")
+    max_suppliers = NumberField(
+        "Maximum suppliers", min=1, num_decimals=0, description="Leave empty to accept any number of contractors"
+    )
+    require_pre_cast = BooleanField("Pre-cast only", default=False)
+    metrics_header = Text("# Metrics")
+    download_metrics_json = DownloadButton("Download metrics (JSON)", method="download_metrics_json")
+    download_metrics_prometheus = DownloadButton("Download metrics (Prometheus)", method="download_metrics_prometheus")
 
 
 class Controller(ViktorController):
@@ -38,200 +91,172 @@ class Controller(ViktorController):
     viktor_enforce_field_constraints = True
 
     @staticmethod
-    def push_prices_to_model(params, entity_id, **kwargs):
-        api = API()
-        children = api.get_entity_children(entity_id=entity_id)
-        contractor_concrete_prices = []
-        contractor_lighting_prices = []
-        concrete_prices_dict = defaultdict(dict)
-        lighting_prices_dict = defaultdict(dict)
-        for child in children:
-            contractor_name = child.name
-            for concrete_type_row in child.last_saved_params.concrete:
-                contractor_concrete_prices.append(
-                    {
-                        "Contractor name": contractor_name,
-                        "Concrete pre cast option": concrete_type_row.pre_cast_option,
-                        "Concrete type": concrete_type_row.concrete_type,
-                        "Concrete lead time": concrete_type_row.lead_time,
-                        "Concrete price per unit": concrete_type_row.price_per_unit,
-                    }
-                )
-                concrete_prices_dict[concrete_type_row.concrete_type].update(
-                    {contractor_name: concrete_type_row.price_per_unit}
-                )
-            for lighting_type_row in child.last_saved_params.lighting:
-                contractor_lighting_prices.append(
-                    {
-                        "Contractor name": contractor_name,
-                        "Lighting type": lighting_type_row.lighting_type,
-                        "Lighting lead time": lighting_type_row.lead_time,
-                        "Lighting price per unit": lighting_type_row.price_per_unit,
-                    }
-                )
-                lighting_prices_dict[lighting_type_row.lighting_type].update(
-                    {contractor_name: lighting_type_row.price_per_unit}
-                )
-        push_prices_to_speckle("concrete", concrete_prices_dict)
-        push_prices_to_speckle("lighting", lighting_prices_dict)
+    def get_entity_children(entity_id) -> list:
+        with telemetry.span("viktor.get_entity_children"):
+            # The entity list is lazy: the children are only requested once it is read, so read it here
+            return list(API().get_entity_children(entity_id=entity_id))
+
+    def push_prices_to_model(self, params, entity_id, **kwargs):
+        children = self.get_entity_children(entity_id)
+        with telemetry.span("aggregate.bid_table"):
+            bid_table = BidTable.from_children(children, quantities={})
+        run_concurrently(
+            {
+                f"push {name}": partial(push_prices_to_speckle, name, bid_table.prices_per_type(name))
+                for name in CATEGORIES
+            }
+        )
         return
 
-    @PlotlyView("Concrete price comparison", duration_guess=1)
+    def get_children_and_model_versions(self, entity_id) -> tuple[list, dict[str, tuple[str, str | None]]]:
+        results, _ = run_concurrently(
+            {
+                "children": partial(self.get_entity_children, entity_id),
+                "model versions": get_quantity_versions,
+            }
+        )
+        return results["children"], results["model versions"]
+
+    @staticmethod
+    def get_bid_table(children, model_versions: dict[str, tuple[str, str | None]] | None = None) -> BidTable:
+        """
+        Tabulate all bids of the children, priced with the model quantities of every category, read from the given
+        `model_versions` or else from the latest ones.
+        """
+        quantities = get_quantities(model_versions)
+        with telemetry.span("aggregate.bid_table"):
+            return BidTable.from_children(children, quantities=quantities)
+
+    @staticmethod
+    def price_comparison_figure(bid_table: BidTable, top_n: int | None = None) -> dict:
+        """Grouped bar chart of the bid totals per type, one row of bars per category."""
+        panels = []
+        for category in CATEGORIES.values():
+            contractors, types, total_prices = bid_table.pivot(category.name, value="total")
+            panels.append(
+                {
+                    "title": f"{category.label} Prices by Contractor and Type",
+                    "x_title": f"{category.label} Type",
+                    "y_title": f"{category.label} Price",
+                    "contractors": contractors,
+                    "types": types,
+                    "matrix": total_prices,
+                }
+            )
+        return grouped_bar_subplots(panels, top_n=top_n)
+
+    @PlotlyView("Price comparison", duration_guess=1)
+    @telemetry.view
     def price_comparison(self, params, entity_id, **kwargs):
-        concrete_data = get_speckle_concrete_volume_dataframe()
-        lighting_data = get_speckle_lighting_dataframe()
-
-        api = API()
-        children = api.get_entity_children(entity_id=entity_id)
-        contractor_concrete_prices = []
-        contractor_lighting_prices = []
-        concrete_prices_dict = defaultdict(list)
-        lighting_prices_dict = defaultdict(list)
-        for child in children:
-            contractor_name = child.name
-            for concrete_type_row in child.last_saved_params.concrete:
-                contractor_concrete_prices.append(
-                    {
-                        "Contractor name": contractor_name,
-                        "Concrete pre cast option": concrete_type_row.pre_cast_option,
-                        "Concrete type": concrete_type_row.concrete_type,
-                        "Concrete lead time": concrete_type_row.lead_time,
-                        "Concrete price per unit": concrete_type_row.price_per_unit,
-                        "Concrete volume": concrete_data[concrete_type_row.concrete_type],
-                        "Concrete total price": concrete_data[concrete_type_row.concrete_type]
-                        * concrete_type_row.price_per_unit,
-                    }
-                )
-                concrete_prices_dict[concrete_type_row.concrete_type].append(concrete_type_row.price_per_unit)
-            for lighting_type_row in child.last_saved_params.lighting:
-                contractor_lighting_prices.append(
-                    {
-                        "Contractor name": contractor_name,
-                        "Lighting type": lighting_type_row.lighting_type,
-                        "Lighting lead time": lighting_type_row.lead_time,
-                        "Lighting price per unit": lighting_type_row.price_per_unit,
-                        "Lighting volume": lighting_data[lighting_type_row.lighting_type],
-                        "Lighting total price": lighting_data[lighting_type_row.lighting_type]
-                        * lighting_type_row.price_per_unit,
-                    }
+        top_n = int(params.chart_top_n) if params.get("chart_top_n") else None
+        children, model_versions = self.get_children_and_model_versions(entity_id)
+        # The figure is keyed on, and built from, the same listing of the commits, whether or not a summary is published
+        object_ids = {name: object_id for name, (object_id, _) in model_versions.items()}
+        key = view_result_key(f"price_comparison:{top_n}", entity_id, children, object_ids)
+        figure_json = view_results.get(key)
+        if figure_json is None:
+            bid_table = self.get_bid_table(children, model_versions)
+            with telemetry.span("plotly.figure"):
+                figure = self.price_comparison_figure(bid_table, top_n)
+            with telemetry.span("plotly.serialize"):
+                figure_json = dumps(figure)
+            view_results.put(key, figure_json)
+        else:
+            telemetry.count("view_cache_hits_total", view="price_comparison")
+        return PlotlyResult(figure_json)
+
+    @DataView("Contractor distances", duration_guess=1)
+    @telemetry.view
+    def contractor_distances(self, params, entity_id, **kwargs):
+        children = self.get_entity_children(entity_id)
+        index = ContractorIndex.from_children(children)
+        ranking = index.nearest(
+            PROJECT_LOCATION.lat, PROJECT_LOCATION.lon, k=RANKING_SIZE, radius_km=params.max_distance
+        )
+        transport_cost_per_km = params.transport_cost_per_km or 0
+        return DataResult(
+            DataGroup(
+                *(
+                    DataItem(
+                        name,
+                        value=f"{distance:.0f}",
+                        suffix="km",
+                        subgroup=DataGroup(
+                            DataItem(
+                                "Transport cost per delivery",
+                                value=f"{distance * transport_cost_per_km:.0f}",
+                                prefix="€",
+                            )
+                        ),
+                    )
+                    for name, distance in ranking
                 )
-                lighting_prices_dict[lighting_type_row.lighting_type].append(lighting_type_row.price_per_unit)
-        print(contractor_concrete_prices)
-
-        print(contractor_lighting_prices)
-
-        # Extracting unique contractors and concrete types
-        contractors = list(set(entry["Contractor name"] for entry in contractor_concrete_prices))
-        concrete_types = list(set(entry["Concrete type"] for entry in contractor_concrete_prices))
-
-        # Initialize a dictionary to store the price per unit for each contractor and concrete type
-        price_per_unit_dict = {
-            contractor: {concrete_type: 0 for concrete_type in concrete_types} for contractor in contractors
-        }
-
-        # Fill the dictionary with the price per unit data
-        for entry in contractor_concrete_prices:
-            contractor = entry["Contractor name"]
-            concrete_type = entry["Concrete type"]
-            price_per_unit = entry["Concrete total price"]
-            price_per_unit_dict[contractor][concrete_type] = price_per_unit
-
-        # Create a stacked bar chart trace for each contractor
-        traces = []
-        for contractor in contractors:
-            prices = [price_per_unit_dict[contractor][concrete_type] for concrete_type in concrete_types]
-            trace = go.Bar(x=concrete_types, y=prices, name=contractor)
-            traces.append(trace)
-
-        # Create the figure
-        fig = go.Figure(data=traces)
-
-        # Update layout
-        fig.update_layout(
-            title="Concrete Prices by Contractor and Type",
-            xaxis_title="Concrete Type",
-            yaxis_title="Concrete Price",
-            barmode="group",
+            )
         )
 
-        return PlotlyResult(fig.to_json())
-
-    @PlotlyView("Lighting price comparison", duration_guess=1)
-    def price_comparison_lighting(self, params, entity_id, **kwargs):
-        concrete_data = get_speckle_concrete_volume_dataframe()
-        lighting_data = get_speckle_lighting_dataframe()
-
-        api = API()
-        children = api.get_entity_children(entity_id=entity_id)
-        contractor_concrete_prices = []
-        contractor_lighting_prices = []
-        concrete_prices_dict = defaultdict(list)
-        lighting_prices_dict = defaultdict(list)
-        for child in children:
-            contractor_name = child.name
-            for concrete_type_row in child.last_saved_params.concrete:
-                contractor_concrete_prices.append(
-                    {
-                        "Contractor name": contractor_name,
-                        "Concrete pre cast option": concrete_type_row.pre_cast_option,
-                        "Concrete type": concrete_type_row.concrete_type,
-                        "Concrete lead time": concrete_type_row.lead_time,
-                        "Concrete price per unit": concrete_type_row.price_per_unit,
-                        "Concrete volume": concrete_data[concrete_type_row.concrete_type],
-                        "Concrete total price": concrete_data[concrete_type_row.concrete_type]
-                        * concrete_type_row.price_per_unit,
-                    }
+    @DataView("Bid award", duration_guess=1)
+    @telemetry.view
+    def bid_award(self, params, entity_id, **kwargs):
+        children = self.get_entity_children(entity_id)
+        index = ContractorIndex.from_children(children)
+        distances = dict(zip(index.names.tolist(), index.distances(PROJECT_LOCATION.lat, PROJECT_LOCATION.lon)[0]))
+        bid_table = self.get_bid_table(children)
+        with telemetry.span("award.solve", bids=len(bid_table)):
+            award = award_bids(
+                bid_table,
+                distances=distances,
+                transport_cost_per_km=params.transport_cost_per_km or 0,
+                max_lead_time=params.max_lead_time,
+                max_suppliers=int(params.max_suppliers) if params.max_suppliers else None,
+                require_pre_cast=params.require_pre_cast,
+            )
+        categories = []
+        for name, category in CATEGORIES.items():
+            # The most expensive items first, as a category can have more types than a data group can list
+            assignments = sorted(
+                (assignment for assignment in award.assignments if assignment.category == name),
+                key=lambda assignment: assignment.cost,
+                reverse=True,
+            )
+            shown, rest = split_data_items(assignments)
+            items = [
+                DataItem(
+                    assignment.type_name,
+                    value=assignment.contractor,
+                    subgroup=DataGroup(
+                        DataItem("Cost", value=f"{assignment.cost:.0f}", prefix="€"),
+                        DataItem("Lead time", value=f"{assignment.lead_time:g}", suffix="weeks"),
+                    ),
                 )
-                concrete_prices_dict[concrete_type_row.concrete_type].append(concrete_type_row.price_per_unit)
-            for lighting_type_row in child.last_saved_params.lighting:
-                contractor_lighting_prices.append(
-                    {
-                        "Contractor name": contractor_name,
-                        "Lighting type": lighting_type_row.lighting_type,
-                        "Lighting lead time": lighting_type_row.lead_time,
-                        "Lighting price per unit": lighting_type_row.price_per_unit,
-                        "Lighting volume": lighting_data[lighting_type_row.lighting_type],
-                        "Lighting total price": lighting_data[lighting_type_row.lighting_type]
-                        * lighting_type_row.price_per_unit,
-                    }
+                for assignment in shown
+            ]
+            if rest:
+                items.append(DataItem(f"… {len(rest)} more", value=f"{sum(a.cost for a in rest):.0f}", prefix="€"))
+            categories.append(
+                DataItem(
+                    category.label,
+                    value=f"{sum(a.cost for a in assignments):.0f}",
+                    prefix="€",
+                    subgroup=DataGroup(*items),
                 )
-                lighting_prices_dict[lighting_type_row.lighting_type].append(lighting_type_row.price_per_unit)
-        print(contractor_concrete_prices)
-
-        print(contractor_lighting_prices)
-
-        # Extracting unique contractors and concrete types
-        contractors = list(set(entry["Contractor name"] for entry in contractor_lighting_prices))
-        lighting_types = list(set(entry["Lighting type"] for entry in contractor_lighting_prices))
-
-        # Initialize a dictionary to store the price per unit for each contractor and lighting type
-        price_per_unit_dict = {
-            contractor: {lighting_type: 0 for lighting_type in lighting_types} for contractor in contractors
-        }
-
-        # Fill the dictionary with the price per unit data
-        for entry in contractor_lighting_prices:
-            contractor = entry["Contractor name"]
-            lighting_type = entry["Lighting type"]
-            price_per_unit = entry["Lighting total price"]
-            price_per_unit_dict[contractor][lighting_type] = price_per_unit
-
-        # Create a stacked bar chart trace for each contractor
-        traces = []
-        for contractor in contractors:
-            prices = [price_per_unit_dict[contractor][lighting_type] for lighting_type in lighting_types]
-            trace = go.Bar(x=lighting_types, y=prices, name=contractor)
-            traces.append(trace)
-
-        # Create the figure
-        fig = go.Figure(data=traces)
-
-        # Update layout
-        fig.update_layout(
-            title="Lighting Prices by Contractor and Type",
-            xaxis_title="Lighting Type",
-            yaxis_title="Lighting Price",
-            barmode="group",
+            )
+        shown, rest = split_data_items(award.unawarded)
+        unawarded = [DataItem(type_name, value=CATEGORIES[name].label) for name, type_name in shown]
+        if rest:
+            unawarded.append(DataItem(f"… {len(rest)} more", value=None))
+        return DataResult(
+            DataGroup(
+                DataItem("Total cost", value=f"{award.total_cost:.0f}", prefix="€"),
+                DataItem("Suppliers", value=", ".join(award.suppliers) or "-"),
+                *categories,
+                DataItem("Not awarded", value=len(award.unawarded), subgroup=DataGroup(*unawarded)),
+            )
         )
 
-        return PlotlyResult(fig.to_json())
+    @staticmethod
+    def download_metrics_json(params, **kwargs):
+        return DownloadResult(telemetry.export_json(), "metrics.json")
+
+    @staticmethod
+    def download_metrics_prometheus(params, **kwargs):
+        return DownloadResult(telemetry.export_prometheus(), "metrics.prom")
@@ -0,0 +1,112 @@
+import json
+
+import numpy as np
+from plotly.colors import DEFAULT_PLOTLY_COLORS
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is in the requirements, the standard library is the fallback
+    orjson = None
+
+# Vertical space between the subplots, as a fraction of the figure height, like `make_subplots` uses
+SUBPLOT_SPACING = 0.3
+SUBPLOT_HEIGHT = 450
+
+
+def top_contractors(contractors: list, matrix: np.ndarray, top_n: int | None) -> tuple[list, np.ndarray]:
+    """
+    Keep the `top_n` contractors that bid on the most types (the lowest total breaking ties), and replace the others
+    by one "Other" row holding their mean bid per type, so a chart stays readable with hundreds of contractors.
+    """
+    if top_n is None or len(contractors) <= top_n:
+        return list(contractors), matrix
+    bids = matrix > 0
+    order = np.lexsort((np.nansum(matrix, axis=1), -bids.sum(axis=1)))
+    kept, others = order[:top_n], order[top_n:]
+    other_bids = bids[others].sum(axis=0)
+    other_mean = np.divide(
+        np.nansum(matrix[others], axis=0), other_bids, out=np.zeros(matrix.shape[1]), where=other_bids > 0
+    )
+    labels = [contractors[index] for index in kept] + [f"Other ({len(others)} contractors, mean)"]
+    return labels, np.vstack([matrix[kept], other_mean])
+
+
+def grouped_bar_subplots(panels: list[dict], top_n: int | None = None) -> dict:
+    """
+    Write the Plotly figure of grouped bar charts stacked in rows straight from arrays, without `graph_objects`.
+
+    Every panel is a dict with `title`, `x_title`, `y_title`, `contractors`, `types` and a contractors × types `matrix`.
+    The bars leave out their x values: the types are written once per panel as the tick labels of its axis, instead
+    of once per contractor. A contractor keeps its color and legend entry across the panels.
+    """
+    rows = len(panels)
+    height = (1 - SUBPLOT_SPACING / rows * (rows - 1)) / rows
+    colors, data, annotations, layout = {}, [], [], {"barmode": "group", "height": SUBPLOT_HEIGHT * rows}
+    for row, panel in enumerate(panels, start=1):
+        suffix = "" if row == 1 else str(row)
+        top = 1 - (row - 1) * (height + SUBPLOT_SPACING / rows)
+        contractors, matrix = top_contractors(panel["contractors"], panel["matrix"], top_n)
+        # Bars are written in whole euros, which halves the payload without changing what the chart shows; a missing
+        # price is no bar, like a type the contractor didn't bid on
+        bars = np.rint(np.nan_to_num(matrix)).astype(np.int64)
+        for contractor, prices in zip(contractors, bars):
+            # The legend lists a contractor once, at the first panel it appears in
+            showlegend = contractor not in colors
+            color = colors.setdefault(contractor, DEFAULT_PLOTLY_COLORS[len(colors) % len(DEFAULT_PLOTLY_COLORS)])
+            data.append(
+                {
+                    "type": "bar",
+                    "y": prices,
+                    "name": contractor,
+                    "legendgroup": contractor,
+                    "showlegend": showlegend,
+                    "marker": {"color": color},
+                    "hovertemplate": "%{fullData.name}: %{y:,}<extra></extra>",
+                    "xaxis": f"x{suffix}",
+                    "yaxis": f"y{suffix}",
+                }
+            )
+        layout[f"xaxis{suffix}"] = {
+            "anchor": f"y{suffix}",
+            "domain": [0.0, 1.0],
+            "title": {"text": panel["x_title"]},
+            "tickmode": "array",
+            "tickvals": np.arange(len(panel["types"])),
+            "ticktext": list(panel["types"]),
+        }
+        layout[f"yaxis{suffix}"] = {
+            "anchor": f"x{suffix}",
+            "domain": [top - height, top],
+            "title": {"text": panel["y_title"]},
+        }
+        annotations.append(
+            {
+                "text": panel["title"],
+                "x": 0.5,
+                "y": top,
+                "xref": "paper",
+                "yref": "paper",
+                "xanchor": "center",
+                "yanchor": "bottom",
+                "showarrow": False,
+                "font": {"size": 16},
+            }
+        )
+    layout["annotations"] = annotations
+    return {"data": data, "layout": layout}
+
+
+def _encode_numpy(value):
+    if isinstance(value, np.ndarray):
+        # NaN isn't valid JSON; Plotly reads null as a missing value, like orjson writes it
+        return np.where(np.isnan(value), None, value).tolist() if value.dtype.kind == "f" else value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def dumps(figure: dict) -> str:
+    """Serialize a figure dict, with NumPy arrays in it, using orjson when available."""
+    if orjson is not None:
+        return orjson.dumps(figure, option=orjson.OPT_SERIALIZE_NUMPY).decode()
+    return json.dumps(figure, default=_encode_numpy, separators=(",", ":"))
@@ -0,0 +1,147 @@
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+from specklepy.objects import Base
+
+from app.model_snapshot import ModelSnapshot
+from app.speckle_cache import CACHE_DIR
+from app.speckle_cache import LRUCache
+
+SUMMARY_BRANCH_PREFIX = "summary/"
+SUMMARY_CACHE_MAX_ENTRIES = int(os.environ.get("SUMMARY_CACHE_MAX_ENTRIES", 64))
+
+
+def summary_branch(category: str) -> str:
+    return f"{SUMMARY_BRANCH_PREFIX}{category}"
+
+
+class QuantitySummary:
+    """
+    Per-type totals of one commit of a category branch: everything the views need, in kilobytes instead of the
+    megabytes of the mesh-bearing commit.
+
+    The element ids are grouped by type, `element_ids[offsets[i]:offsets[i + 1]]` being those of `types[i]`. They are
+    left out (None) when the summary was read from the server, where they are stored in a detached child.
+    """
+
+    def __init__(self, category: str, object_id: str, types, volumes, counts, element_ids=None, offsets=None):
+        self.category = category
+        self.object_id = object_id
+        self.types = np.asarray(types, dtype=object)
+        self.volumes = np.asarray(volumes, dtype=float)
+        self.counts = np.asarray(counts, dtype=np.int64)
+        self.element_ids = None if element_ids is None else np.asarray(element_ids, dtype=object)
+        self.offsets = None if offsets is None else np.asarray(offsets, dtype=np.int64)
+
+    @classmethod
+    def from_snapshot(cls, category: str, snapshot: ModelSnapshot) -> "QuantitySummary":
+        counts = np.bincount(snapshot.codes, minlength=len(snapshot.types))
+        order = np.argsort(snapshot.codes, kind="stable")
+        return cls(
+            category,
+            snapshot.object_id,
+            snapshot.types,
+            snapshot.totals("volume").to_numpy(),
+            counts,
+            snapshot.element_ids[order],
+            np.concatenate([[0], np.cumsum(counts)]),
+        )
+
+    def with_object_id(self, object_id: str, keep_elements: bool = True) -> "QuantitySummary":
+        """
+        The same summary for another commit with the same elements, e.g. one that only changed their prices. Element
+        ids that are object ids change along with the elements, so those are left out with `keep_elements=False`.
+        """
+        element_ids, offsets = (self.element_ids, self.offsets) if keep_elements else (None, None)
+        return QuantitySummary(self.category, object_id, self.types, self.volumes, self.counts, element_ids, offsets)
+
+    def type_names(self) -> list[str]:
+        return sorted(self.types)
+
+    def totals(self, quantity: str = "volume") -> pd.Series:
+        """The `volume` or `count` total per type name."""
+        column = self.volumes if quantity == "volume" else self.counts.astype(float)
+        return pd.Series(column, index=pd.Index(self.types, dtype=object), dtype=float)
+
+    def elements(self, name: str) -> list:
+        if self.element_ids is None:
+            raise ValueError(f"the summary of {self.category} was read without its element ids")
+        positions = np.flatnonzero(self.types == name)
+        if not len(positions):
+            return []
+        return self.element_ids[self.offsets[positions[0]] : self.offsets[positions[0] + 1]].tolist()
+
+    def to_base(self) -> Base:
+        """Speckle object of the summary; the element ids are detached, so the root alone stays small."""
+        base = Base(
+            category=self.category,
+            source_object_id=self.object_id,
+            types=self.types.tolist(),
+            volumes=self.volumes.tolist(),
+            counts=self.counts.tolist(),
+        )
+        if self.element_ids is not None:
+            base["@elements"] = Base(ids=self.element_ids.tolist(), offsets=self.offsets.tolist())
+        return base
+
+    @classmethod
+    def from_serialized(cls, obj: dict) -> "QuantitySummary":
+        """Read a summary from its serialized root, as returned by the server's single object endpoint."""
+        return cls(obj["category"], obj["source_object_id"], obj["types"], obj["volumes"], obj["counts"])
+
+    def save(self, path: str):
+        arrays = {"types": self.types.astype(str), "volumes": self.volumes, "counts": self.counts}
+        if self.element_ids is not None:
+            arrays.update(element_ids=self.element_ids.astype(str), offsets=self.offsets)
+        # Write under a unique temporary name first, so a concurrent reader never sees a partial file and concurrent
+        # writers, in this process or another, never move each other's file
+        descriptor, temporary_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp.npz")
+        try:
+            with os.fdopen(descriptor, "wb") as file:
+                np.savez(file, **arrays)
+            os.replace(temporary_path, path)
+        except BaseException:
+            os.remove(temporary_path)
+            raise
+
+    @classmethod
+    def load(cls, path: str, category: str, object_id: str) -> "QuantitySummary":
+        with np.load(path, allow_pickle=False) as arrays:
+            return cls(
+                category,
+                object_id,
+                arrays["types"],
+                arrays["volumes"],
+                arrays["counts"],
+                arrays["element_ids"] if "element_ids" in arrays else None,
+                arrays["offsets"] if "offsets" in arrays else None,
+            )
+
+
+class SummaryStore:
+    """Quantity summaries keyed by category and commit object id, in memory and as `.npz` files on disk."""
+
+    def __init__(self, base_path: str = CACHE_DIR, max_entries: int = SUMMARY_CACHE_MAX_ENTRIES):
+        self.directory = os.path.join(base_path, "summaries")
+        self._summaries = LRUCache(max_entries)
+
+    @property
+    def stats(self):
+        return self._summaries.stats
+
+    def path(self, category: str, object_id: str) -> str:
+        return os.path.join(self.directory, f"{category}-{object_id}.npz")
+
+    def get(self, category: str, object_id: str) -> QuantitySummary | None:
+        summary = self._summaries.get((category, object_id))
+        if summary is None and os.path.exists(self.path(category, object_id)):
+            summary = QuantitySummary.load(self.path(category, object_id), category, object_id)
+            self._summaries.put((category, object_id), summary)
+        return summary
+
+    def put(self, summary: QuantitySummary):
+        os.makedirs(self.directory, exist_ok=True)
+        summary.save(self.path(summary.category, summary.object_id))
+        self._summaries.put((summary.category, summary.object_id), summary)
@@ -0,0 +1,353 @@
+import json
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import Counter
+from collections import OrderedDict
+from contextlib import closing
+from contextlib import contextmanager
+from dataclasses import asdict
+from dataclasses import dataclass
+from typing import Callable
+from typing import Iterator
+
+from specklepy.api import operations
+from specklepy.objects import Base
+from specklepy.transports.abstract_transport import AbstractTransport
+from specklepy.transports.sqlite import SQLiteTransport
+
+from app.speckle_traversal import iter_serialized_objects
+from app.telemetry import telemetry
+
+CACHE_DIR = os.environ.get("SPECKLE_CACHE_DIR", os.path.join(tempfile.gettempdir(), "viktor-speckle-cache"))
+CACHE_MAX_ENTRIES = int(os.environ.get("SPECKLE_CACHE_MAX_ENTRIES", 16))
+CACHE_MAX_DISK_MB = float(os.environ.get("SPECKLE_CACHE_MAX_DISK_MB", 512))
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    invalidations: int = 0
+
+    def as_dict(self):
+        return asdict(self)
+
+
+class LRUCache:
+    """
+    Thread-safe mapping that drops the least recently used entries once it holds more than `max_entries`, or, when
+    `max_bytes` is given, once the `sizeof` of its values adds up to more than `max_bytes`.
+    """
+
+    def __init__(self, max_entries: int, max_bytes: int | None = None, sizeof: Callable = len):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self.stats = CacheStats()
+        self._entries = OrderedDict()
+        self._sizes = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    @property
+    def size(self) -> int:
+        return sum(self._sizes.values())
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._entries:
+                self.stats.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.stats.hits += 1
+            return self._entries[key]
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            if self.max_bytes is not None:
+                self._sizes[key] = self.sizeof(value)
+            while len(self._entries) > self.max_entries or (
+                self.max_bytes is not None and len(self._entries) > 1 and sum(self._sizes.values()) > self.max_bytes
+            ):
+                evicted_key, _ = self._entries.popitem(last=False)
+                self._sizes.pop(evicted_key, None)
+                self.stats.evictions += 1
+
+    def pop(self, key, default=None):
+        with self._lock:
+            self._sizes.pop(key, None)
+            return self._entries.pop(key, default)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._sizes.clear()
+
+
+class TTLCache:
+    """
+    Values that are reloaded once they are older than `ttl` seconds.
+
+    If reloading fails the stale value is served instead, so a Speckle hiccup doesn't break the editor of an entity.
+    """
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self.stats = CacheStats()
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get_or_load(self, key, loader: Callable):
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is not None and time.monotonic() - entry[0] < self.ttl:
+            self.stats.hits += 1
+            return entry[1]
+        self.stats.misses += 1
+        try:
+            value = loader()
+        except Exception:
+            if entry is None:
+                raise
+            return entry[1]
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+        return value
+
+    def invalidate(self, key=None):
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+            self.stats.invalidations += 1
+
+
+class SpeckleObjectCache:
+    """
+    Two-level cache for received Speckle objects, keyed by the object id a commit references.
+
+    Deserialized objects are kept in an in-memory LRU; their serialized children are persisted in a local
+    `SQLiteTransport`, so a cold process only has to download objects it has never seen before. Because object ids
+    are content hashes an entry never goes stale, but the entry of a branch is dropped as soon as a newer commit is
+    seen on it, so superseded models don't occupy the LRU.
+
+    The local database is kept under `max_disk_mb` by deleting the least recently used commit objects, with the
+    children no other commit object references. Objects that are being read are never deleted.
+
+    `stats` counts a hit for every object served from memory or from the local database, and a miss for every object
+    that had to be downloaded.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = CACHE_MAX_ENTRIES,
+        max_disk_mb: float = CACHE_MAX_DISK_MB,
+        base_path: str = CACHE_DIR,
+    ):
+        self.max_disk_bytes = int(max_disk_mb * 1000 * 1000)
+        self.base_path = base_path
+        self.stats = CacheStats()
+        self._objects = LRUCache(max_entries)
+        self._branch_objects = {}
+        self._in_use = Counter()
+        self._writers = 0
+        self._initialised = False
+        self._lock = threading.Lock()
+
+    def track_commit(self, branch_name: str, object_id: str):
+        """Record the object referenced by the latest commit of a branch, invalidating the one it replaces."""
+        with self._lock:
+            previous_object_id = self._branch_objects.get(branch_name)
+            self._branch_objects[branch_name] = object_id
+        if previous_object_id is not None and previous_object_id != object_id:
+            if self._objects.pop(previous_object_id) is not None:
+                self.stats.invalidations += 1
+
+    def receive(self, object_id: str, remote_transport_factory: Callable[[], AbstractTransport]) -> Base:
+        """Return the object with the given id, only creating a remote transport when it is not cached locally."""
+        base = self._objects.get(object_id)
+        if base is not None:
+            self.stats.hits += 1
+            return base
+        local_transport = self._open_with_object(object_id, remote_transport_factory)
+        try:
+            with telemetry.span("speckle.receive", object_id=object_id):
+                base = operations.receive(obj_id=object_id, local_transport=local_transport)
+        finally:
+            self._close(object_id, local_transport)
+        self._objects.put(object_id, base)
+        self._record_use(object_id)
+        return base
+
+    def iter_objects(
+        self,
+        object_id: str,
+        remote_transport_factory: Callable[[], AbstractTransport],
+        member: str | None = None,
+        speckle_type: str | None = None,
+        attribute: str | None = None,
+    ) -> Iterator[dict]:
+        """
+        Stream the serialized objects below `member` of the object with the given id, see `iter_serialized_objects`.
+
+        The objects are read one by one from the local transport instead of being recomposed into a `Base` tree, so
+        memory stays flat however large the model is. Nothing is added to the in-memory LRU.
+        """
+        local_transport = self._open_with_object(object_id, remote_transport_factory)
+        try:
+            root = json.loads(local_transport.get_object(object_id))
+            start = root if member is None else root[member]
+            yield from iter_serialized_objects(local_transport, start, speckle_type, attribute)
+        finally:
+            self._close(object_id, local_transport)
+        self._record_use(object_id)
+
+    def store(self, object_id: str, base: Base):
+        """Add an object that was written to the local transport, e.g. by `operations.send`."""
+        self._objects.put(object_id, base)
+        self._record_use(object_id)
+
+    def discard(self, object_id: str):
+        self._objects.pop(object_id)
+
+    def clear(self):
+        self._objects.clear()
+        with self._lock:
+            self._branch_objects.clear()
+
+    def open_local_transport(self) -> SQLiteTransport:
+        self._initialise_database()
+        # SQLite connections can't be shared between threads, so every caller opens its own
+        return SQLiteTransport(base_path=self.base_path, scope="Objects")
+
+    def _initialise_database(self):
+        """
+        Create the database on first use from a single thread: switching a new database to WAL fails with "database is
+        locked" while other threads open it too.
+        """
+        with self._lock:
+            if self._initialised:
+                return
+            SQLiteTransport(base_path=self.base_path, scope="Objects").close()
+            with closing(self._connect()) as connection, connection:
+                connection.execute(
+                    "CREATE TABLE IF NOT EXISTS object_access(hash TEXT PRIMARY KEY, used REAL) WITHOUT ROWID"
+                )
+            self._initialised = True
+
+    @contextmanager
+    def writing_transport(self) -> Iterator[SQLiteTransport]:
+        """Local transport to send new objects to, e.g. a commit made by the app; nothing is evicted meanwhile."""
+        with self._writing():
+            local_transport = self.open_local_transport()
+            try:
+                yield local_transport
+            finally:
+                local_transport.close()
+
+    @contextmanager
+    def _writing(self):
+        with self._lock:
+            self._writers += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._writers -= 1
+
+    def _open_with_object(
+        self, object_id: str, remote_transport_factory: Callable[[], AbstractTransport]
+    ) -> SQLiteTransport:
+        """
+        Open the local transport, first downloading the object and its children into it if they aren't there. The
+        object is kept on disk until the transport is passed to `_close`.
+        """
+        with self._lock:
+            self._in_use[object_id] += 1
+        local_transport = self.open_local_transport()
+        try:
+            if local_transport.get_object(object_id) is None:
+                self.stats.misses += 1
+                with self._writing(), telemetry.span("speckle.download", object_id=object_id):
+                    remote_transport_factory().copy_object_and_children(object_id, local_transport)
+            else:
+                self.stats.hits += 1
+        except Exception:
+            self._close(object_id, local_transport)
+            raise
+        return local_transport
+
+    def _close(self, object_id: str, local_transport: SQLiteTransport):
+        local_transport.close()
+        with self._lock:
+            self._in_use[object_id] -= 1
+            if not self._in_use[object_id]:
+                del self._in_use[object_id]
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(os.path.join(self.base_path, "Objects.db"), timeout=30)
+
+    def _record_use(self, object_id: str):
+        """Mark an object as just used, and evict the least recently used ones while the database is too large."""
+        try:
+            with closing(self._connect()) as connection:
+                with connection:
+                    connection.execute(
+                        "INSERT OR REPLACE INTO object_access(hash, used) VALUES(?, ?)", (object_id, time.time())
+                    )
+                if self._used_bytes(connection) > self.max_disk_bytes:
+                    self._evict(connection)
+        except sqlite3.Error as exception:
+            # The object was read already; a busy or broken cache database shouldn't fail the read
+            logger.warning("could not enforce the object cache disk limit: %r", exception)
+
+    @staticmethod
+    def _used_bytes(connection: sqlite3.Connection) -> int:
+        # Deleted rows free pages that later writes reuse, so the pages in use bound the database size
+        (page_size,) = connection.execute("PRAGMA page_size").fetchone()
+        (page_count,) = connection.execute("PRAGMA page_count").fetchone()
+        (free_pages,) = connection.execute("PRAGMA freelist_count").fetchone()
+        return (page_count - free_pages) * page_size
+
+    def _evict(self, connection: sqlite3.Connection):
+        with self._lock:
+            in_use = list(self._in_use)
+        roots = [row[0] for row in connection.execute("SELECT hash FROM object_access ORDER BY used")]
+        closures = {}
+        for root in dict.fromkeys(roots + in_use):
+            row = connection.execute("SELECT content FROM objects WHERE hash = ?", (root,)).fetchone()
+            closures[root] = list(json.loads(row[0]).get("__closure", {})) if row else []
+        # Children are shared between commits, e.g. the meshes whose prices a push left unchanged
+        references = Counter(child for closure in closures.values() for child in closure)
+        for root in roots:
+            with self._lock:
+                # Stop when objects are being written, or read without being accounted for in `references`
+                if self._writers or not self._in_use.keys() <= closures.keys():
+                    break
+                if root in self._in_use:
+                    continue
+                references.subtract(closures[root])
+                unreferenced = [child for child in closures[root] if references[child] <= 0]
+                with connection:
+                    connection.executemany(
+                        "DELETE FROM objects WHERE hash = ?", [(object_id,) for object_id in [root, *unreferenced]]
+                    )
+                    connection.execute("DELETE FROM object_access WHERE hash = ?", (root,))
+            self.stats.evictions += 1
+            if self._used_bytes(connection) <= self.max_disk_bytes:
+                break
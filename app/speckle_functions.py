@@ -1,4 +1,10 @@
+import asyncio
+import json
+import logging
 import os
+import threading
+from collections import defaultdict
+from functools import partial
 
 import pandas as pd
 from specklepy.api import operations
@@ -6,114 +12,340 @@ from specklepy.api.client import SpeckleClient
 from specklepy.objects import Base
 from specklepy.transports.server import ServerTransport
 
-speckle_api_key = os.environ["SPECKLE_API"]
-stream_id = os.environ["SPECKLE_STREAM_ID"]
-client = SpeckleClient(host="https://app.speckle.systems")
-client.authenticate_with_token(speckle_api_key)
+from app.categories import CATEGORIES
+from app.concurrency import run_concurrently
+from app.model_snapshot import ModelSnapshot
+from app.quantity_summary import SUMMARY_BRANCH_PREFIX
+from app.quantity_summary import QuantitySummary
+from app.quantity_summary import SummaryStore
+from app.quantity_summary import summary_branch
+from app.speckle_cache import CACHE_MAX_ENTRIES
+from app.speckle_cache import LRUCache
+from app.speckle_cache import SpeckleObjectCache
+from app.speckle_cache import TTLCache
+from app.speckle_poller import BranchPoller
+from app.speckle_transport import TransportPool
+from app.telemetry import telemetry
+
+# Every quantity element in a category object carries its type name in this attribute
+ELEMENT_NAME_FIELD = "Name"
+
+SPECKLE_HOST = "https://app.speckle.systems"
+# Upper bound on the branches listed in one request, which returns the latest commit of all of them at once
+BRANCHES_LIMIT = int(os.environ.get("SPECKLE_BRANCHES_LIMIT", 100))
+NAME_INDEX_TTL = float(os.environ.get("SPECKLE_NAME_INDEX_TTL", 300))
+# Commit the summary of every newly read commit to a summary branch, so other processes don't need the full commit.
+# Off by default: it writes branches and commits to the stream from read-only views and the poller
+PUBLISH_SUMMARIES = os.environ.get("SPECKLE_PUBLISH_SUMMARIES", "0") == "1"
+# Take the quantities off this IFC file instead of the Speckle commits; prices are still written to Speckle
+IFC_MODEL_PATH = os.environ.get("IFC_MODEL_PATH")
+
+stream_id = os.environ.get("SPECKLE_STREAM_ID")
+object_cache = SpeckleObjectCache()
+snapshot_cache = LRUCache(CACHE_MAX_ENTRIES)
+summary_store = SummaryStore()
+name_index = TTLCache(NAME_INDEX_TTL)
+transport_pool = TransportPool()
+published_summaries = set()
+
+logger = logging.getLogger(__name__)
+
+_client = None
+_client_lock = threading.Lock()
+_publish_lock = threading.Lock()
+_push_locks = defaultdict(threading.Lock)
+
+
+def get_client() -> SpeckleClient:
+    """Return the shared Speckle client, authenticating it on first use rather than at import."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            client = SpeckleClient(host=SPECKLE_HOST)
+            client.authenticate_with_token(os.environ["SPECKLE_API"])
+            _client = client
+    return _client
+
+
+def list_branches() -> list:
+    """List the branches of the stream with their latest commit, in a single request."""
+    with telemetry.span("speckle.list_branches"):
+        return get_client().branch.list(stream_id=stream_id, branches_limit=BRANCHES_LIMIT, commits_limit=1)
 
 
 def get_speckle_models(**kwargs):
-    branches = client.branch.list(stream_id=stream_id)
-    branch_names = [branche.name for branche in branches if branche.name != "main"]
+    branches = list_branches()
+    branch_names = [
+        branche.name
+        for branche in branches
+        if branche.name != "main" and not branche.name.startswith(SUMMARY_BRANCH_PREFIX)
+    ]
     return branch_names
 
 
-def flatten_base(base: Base):
-    if hasattr(base, "elements") and base.elements is not None:
-        for element in base["elements"]:
-            yield from flatten_base(element)
-    yield base
+def get_latest_object_id(branch_name: str) -> str:
+    branch = get_client().branch.get(stream_id, branch_name, 1)
+    object_id = branch.commits.items[0].referencedObject
+    object_cache.track_commit(branch_name, object_id)
+    return object_id
 
 
-def push_prices_to_speckle(branch_name: str, prices_dict: dict[str, dict[str, float]]):
-    branch = client.branch.get(stream_id, branch_name, 1)
-    object_id = branch.commits.items[0].referencedObject
-    transport = ServerTransport(client=client, stream_id=stream_id)
-    received_base = operations.receive(obj_id=object_id, remote_transport=transport)
-    if branch_name == "concrete":
-        new_base = received_base["@Concrete"]
+def list_latest_commits() -> dict[str, tuple[str, str | None]]:
+    """
+    Return the object id of the latest commit of every category branch, and the object id of its published summary or
+    None, all read from one branch listing.
+    """
+    object_ids, summary_ids = {}, {}
+    for branch in list_branches():
+        if not branch.commits.items:
+            continue
+        commit = branch.commits.items[0]
+        if branch.name in CATEGORIES:
+            object_ids[branch.name] = commit.referencedObject
+            object_cache.track_commit(branch.name, commit.referencedObject)
+        elif branch.name.startswith(SUMMARY_BRANCH_PREFIX):
+            # The message of a summary commit is the object id of the commit it summarizes
+            summary_ids[(branch.name[len(SUMMARY_BRANCH_PREFIX) :], commit.message)] = commit.referencedObject
+    return {name: (object_id, summary_ids.get((name, object_id))) for name, object_id in object_ids.items()}
+
+
+def get_latest_commits() -> dict[str, tuple[str, str | None]]:
+    """Latest commits as last listed by the background poller, or listed now when it has no recent listing."""
+    poller.start()
+    commits = poller.latest()
+    return commits if commits is not None else list_latest_commits()
+
+
+def new_server_transport() -> ServerTransport:
+    return transport_pool.transport(get_client(), stream_id)
+
+
+def receive_object(object_id: str) -> Base:
+    return object_cache.receive(object_id, new_server_transport)
+
+
+def get_model_snapshot(branch_name: str, object_id: str | None = None) -> ModelSnapshot:
+    object_id = object_id or get_latest_object_id(branch_name)
+    snapshot = snapshot_cache.get(object_id)
+    if snapshot is None:
+        category = CATEGORIES[branch_name]
+        elements = object_cache.iter_objects(
+            object_id, new_server_transport, member=category.member, attribute=ELEMENT_NAME_FIELD
+        )
+        with telemetry.span("aggregate.snapshot", category=branch_name):
+            snapshot = ModelSnapshot.from_objects(object_id, elements, quantity_field=category.quantity_field)
+        telemetry.count("elements_aggregated_total", len(snapshot), category=branch_name)
+        snapshot_cache.put(object_id, snapshot)
+    return snapshot
+
+
+def publish_summary(summary: QuantitySummary):
+    """
+    Commit a summary to the summary branch of its category, with the object id it summarizes as message. A summary is
+    published once per process, also when a view and the poller read the same new commit at the same time.
+    """
+    key = (summary.category, summary.object_id)
+    with _publish_lock:
+        if key in published_summaries:
+            return
+        published_summaries.add(key)
+    branch_name = summary_branch(summary.category)
+    try:
+        client = get_client()
+        if branch_name not in [branch.name for branch in list_branches()]:
+            client.branch.create(stream_id, branch_name, f"Quantity summaries of the {summary.category} commits")
+        with telemetry.span("speckle.send", object="summary"):
+            summary_id = operations.send(
+                summary.to_base(), transports=[new_server_transport()], use_default_cache=False
+            )
+        client.commit.create(
+            stream_id=stream_id,
+            branch_name=branch_name,
+            object_id=summary_id,
+            message=summary.object_id,
+            source_application="viktor",
+        )
+        telemetry.count("summaries_published_total", category=summary.category)
+    except Exception as exception:
+        # Publishing is an optimization for other readers, e.g. a token without write access shouldn't break a view
+        logger.warning("could not publish the summary of %s: %r", summary.category, exception)
+        with _publish_lock:
+            published_summaries.discard(key)
+
+
+def get_quantity_summary(branch_name: str, object_id: str, summary_id: str | None = None) -> QuantitySummary:
+    """
+    Return the quantity summary of a commit.
+
+    It is read from the local store, else as the root of the published summary object alone, through the single
+    object endpoint. Only when neither exists is the full commit read, after which its summary is published.
+    """
+    summary = summary_store.get(branch_name, object_id)
+    if summary is not None:
+        return summary
+    if summary_id is not None:
+        with telemetry.span("speckle.get_object", object="summary"):
+            summary = QuantitySummary.from_serialized(json.loads(new_server_transport().get_object(summary_id)))
     else:
-        new_base = received_base["@Lighting"]
-    # Consume
-    print("new base", new_base.__dict__)
-    for key, potential_mesh_list in new_base.__dict__.items():
-        if isinstance(potential_mesh_list, list):
-            for mesh in potential_mesh_list:
-                mesh["prices"] = prices_dict[mesh["Name"]]
-    transport = ServerTransport(client=client, stream_id=stream_id)
-    new_object_id = operations.send(base=received_base, transports=[transport])
-    print(f"new ojbect id {new_object_id}")
-    commit_id = client.commit.create(
-        stream_id=stream_id,
-        branch_name=branch_name,
-        object_id=new_object_id,
-        message="Update from viktor app",
-        source_application="viktor",
-    )
-    print(f"new commit id {commit_id}")
-
-
-def get_speckle_concrete_volume_dataframe(**kwargs):
-    branch = client.branch.get(stream_id, "concrete", 1)
-    object_id = branch.commits.items[0].referencedObject
-    transport = ServerTransport(client=client, stream_id=stream_id)
-    received_base = operations.receive(obj_id=object_id, remote_transport=transport)
-    new_base = received_base["@Concrete"]
-    # Consume
-    l = []
-    for key, potential_mesh_list in new_base.__dict__.items():
-        if isinstance(potential_mesh_list, list):
-            for mesh in potential_mesh_list:
-                l.append({mesh["Name"]: mesh["Volume (m³)"]})
-    dataframe = pd.DataFrame(l).sum()
-    return dataframe
+        snapshot = get_model_snapshot(branch_name, object_id)
+        with telemetry.span("aggregate.summary", category=branch_name):
+            summary = QuantitySummary.from_snapshot(branch_name, snapshot)
+        if PUBLISH_SUMMARIES:
+            publish_summary(summary)
+    summary_store.put(summary)
+    return summary
 
 
-def get_speckle_lighting_dataframe(**kwargs):
-    branch = client.branch.get(stream_id, "lighting", 1)
-    object_id = branch.commits.items[0].referencedObject
-    transport = ServerTransport(client=client, stream_id=stream_id)
-    received_base = operations.receive(obj_id=object_id, remote_transport=transport)
-    new_base = received_base["@Lighting"]
-    # Consume
-    l = []
-    for key, potential_mesh_list in new_base.__dict__.items():
-        if isinstance(potential_mesh_list, list):
-            for mesh in potential_mesh_list:
-                l.append({mesh["Name"]: 1})
-    dataframe = pd.DataFrame(l).sum()
-    return dataframe
+def get_quantity_summaries(commits: dict[str, tuple[str, str | None]] | None = None) -> dict[str, QuantitySummary]:
+    """
+    Read the quantity summaries of all registered categories.
 
+    The latest commits of all category branches and their summaries come from a single branch listing, unless the
+    `commits` returned by `get_quantity_versions` are given, and the summaries that aren't stored locally yet are
+    fetched side by side. Categories without a commit get an empty summary.
+    """
+    if IFC_MODEL_PATH:
+        # ifcopenshell is only imported when an IFC model is configured
+        from app.ifc_quantities import get_ifc_snapshot
 
-def get_speckle_concrete_names(**kwargs):
-    branch = client.branch.get(stream_id, "concrete", 1)
-    object_id = branch.commits.items[0].referencedObject
-    transport = ServerTransport(client=client, stream_id=stream_id)
-    received_base = operations.receive(obj_id=object_id, remote_transport=transport)
-    new_base = received_base["@Concrete"]
-    print(new_base.__dict__)
-    # Consume
-    l = []
-    for key, potential_mesh_list in new_base.__dict__.items():
-        if isinstance(potential_mesh_list, list):
-            for mesh in potential_mesh_list:
-                l.append(mesh["Name"])
-    print(l)
-    return list(set(l))
+        return {
+            name: QuantitySummary.from_snapshot(name, get_ifc_snapshot(IFC_MODEL_PATH, name)) for name in CATEGORIES
+        }
+    commits = get_latest_commits() if commits is None else commits
+    summaries = {name: summary_store.get(name, object_id) for name, (object_id, _) in commits.items()}
+    missing = {
+        name: partial(get_quantity_summary, name, object_id, summary_id)
+        for name, (object_id, summary_id) in commits.items()
+        if summaries[name] is None
+    }
+    if missing:
+        loaded, _ = run_concurrently(missing)
+        summaries.update(loaded)
+    return {
+        name: summaries.get(name) or QuantitySummary.from_snapshot(name, ModelSnapshot.empty()) for name in CATEGORIES
+    }
 
 
-def get_speckle_lighting_names(**kwargs):
-    branch = client.branch.get(stream_id, "lighting", 1)
-    object_id = branch.commits.items[0].referencedObject
-    transport = ServerTransport(client=client, stream_id=stream_id)
-    received_base = operations.receive(obj_id=object_id, remote_transport=transport)
-    new_base = received_base["@Lighting"]
-    print(new_base.__dict__)
-    # Consume
-    l = []
-    for key, potential_mesh_list in new_base.__dict__.items():
+def get_quantity_versions() -> dict[str, tuple[str, str | None]]:
+    """
+    Identify the model revisions the quantities of all categories are read from, as the object id of each category's
+    latest commit and the object id of its summary or None. Pass them to `get_quantities` to read those revisions.
+    """
+    if IFC_MODEL_PATH:
+        from app.ifc_quantities import ifc_version
+
+        return dict.fromkeys(CATEGORIES, (ifc_version(IFC_MODEL_PATH), None))
+    return get_latest_commits()
+
+
+def get_quantities(commits: dict[str, tuple[str, str | None]] | None = None) -> dict[str, pd.Series]:
+    """Per-type totals of every category: volumes or element counts, as the category measures them."""
+    summaries = get_quantity_summaries(commits)
+    return {name: summary.totals(CATEGORIES[name].quantity) for name, summary in summaries.items()}
+
+
+def warm_categories(changed: dict[str, tuple[str, str | None]]):
+    """Read the summaries and type names of the categories whose latest commit changed."""
+    get_quantity_summaries()
+    for name in changed:
+        name_index.invalidate(name)
+        get_type_names(name)
+    logger.info("warmed the caches of %s", ", ".join(changed))
+
+
+def subscribe_to_versions(callback):
+    """Call `callback` on every new version of the project, blocking for as long as the subscription lives."""
+    client = get_client()
+    if getattr(client, "subscription", None) is None:
+        raise RuntimeError("the Speckle client has no subscription API")
+    asyncio.run(client.subscription.project_versions_updated(lambda message: callback(), stream_id))
+
+
+# A category changes with the object id of its latest commit, not when its summary is published
+poller = BranchPoller(
+    list_latest_commits, warm_categories, subscribe=subscribe_to_versions, version=lambda commit: commit[0]
+)
+
+
+telemetry.register_gauges("object_cache", lambda: object_cache.stats.as_dict())
+telemetry.register_gauges("summary_store", lambda: summary_store.stats.as_dict())
+telemetry.register_gauges("transport", lambda: transport_pool.stats.as_dict())
+telemetry.register_gauges("poller", lambda: poller.stats.as_dict())
+
+
+def push_prices_to_speckle(branch_name: str, prices_dict: dict[str, dict[str, float]]) -> str | None:
+    """
+    Write the contractor prices onto the meshes of the latest commit of a branch.
+
+    Only meshes whose stored prices differ are touched, and no commit is made when none do. With an IFC model, only
+    meshes named like one of the bid types are touched. The mesh lists are sent as detached children, so unchanged
+    meshes keep their object id and the server's diff endpoint skips their upload.
+
+    The prices are written onto the cached object of the commit, so pushes to one branch run one at a time.
+    """
+    with _push_locks[branch_name]:
+        return _push_prices(branch_name, prices_dict)
+
+
+def _push_prices(branch_name: str, prices_dict: dict[str, dict[str, float]]) -> str | None:
+    object_id = get_latest_object_id(branch_name)
+    received_base = receive_object(object_id)
+    new_base = received_base[CATEGORIES[branch_name].member]
+    changed_meshes = []
+    for key, potential_mesh_list in list(new_base.__dict__.items()):
         if isinstance(potential_mesh_list, list):
+            new_base.add_detachable_attrs({key})
             for mesh in potential_mesh_list:
-                l.append(mesh["Name"])
-    print(l)
-    return list(set(l))
+                if IFC_MODEL_PATH and mesh["Name"] not in prices_dict:
+                    # The bids are on IFC type names, so a mesh no bid names keeps the prices it has
+                    continue
+                prices = prices_dict.get(mesh["Name"], {})
+                if mesh.__dict__.get("prices") != prices:
+                    changed_meshes.append((mesh, prices))
+    if not changed_meshes:
+        logger.info("prices on %s are up to date, nothing to commit", branch_name)
+        return None
+
+    for mesh, prices in changed_meshes:
+        # A copy, so the cached object doesn't change along with the caller's dict
+        mesh["prices"] = dict(prices)
+    try:
+        client = get_client()
+        transport = new_server_transport()
+        with object_cache.writing_transport() as local_transport, telemetry.span(
+            "speckle.send", object="prices", meshes=len(changed_meshes)
+        ):
+            new_object_id = operations.send(
+                base=received_base, transports=[transport, local_transport], use_default_cache=False
+            )
+        commit_id = client.commit.create(
+            stream_id=stream_id,
+            branch_name=branch_name,
+            object_id=new_object_id,
+            message="Update from viktor app",
+            source_application="viktor",
+        )
+    except Exception:
+        # The cached object now carries prices that never reached the server
+        object_cache.discard(object_id)
+        raise
+    object_cache.store(new_object_id, received_base)
+    object_cache.track_commit(branch_name, new_object_id)
+    poller.expire()
+    # Prices don't change the quantities, so the summary of the previous commit holds for the new one; only meshes
+    # without an application id are listed by their object id, which the new prices changed
+    summary = summary_store.get(branch_name, object_id)
+    if summary is not None:
+        stable_ids = all(mesh.applicationId for mesh, _ in changed_meshes)
+        summary = summary.with_object_id(new_object_id, keep_elements=stable_ids)
+        summary_store.put(summary)
+        if PUBLISH_SUMMARIES:
+            publish_summary(summary)
+    telemetry.count("meshes_repriced_total", len(changed_meshes), category=branch_name)
+    logger.info("updated prices of %d meshes on %s, new commit id %s", len(changed_meshes), branch_name, commit_id)
+    return commit_id
+
+
+def get_type_names(category: str, params=None, **kwargs) -> list[str]:
+    """Type names of a category, as options of the type field of its bids."""
+    return name_index.get_or_load(category, lambda: get_quantity_summaries()[category].type_names())
@@ -0,0 +1,133 @@
+import logging
+import os
+import threading
+import time
+from dataclasses import asdict
+from dataclasses import dataclass
+from typing import Callable
+
+# Seconds between two listings of the branches, 0 disables the background poller
+POLL_INTERVAL = float(os.environ.get("SPECKLE_POLL_INTERVAL", 30))
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class PollerStats:
+    polls: int = 0
+    changes: int = 0
+    errors: int = 0
+    subscription_events: int = 0
+
+    def as_dict(self):
+        return asdict(self)
+
+
+class BranchPoller:
+    """
+    Background thread that keeps track of the latest commit of every branch, and warms the caches when one changes.
+
+    Every `interval` seconds, or as soon as the `subscribe` callback reports a new version, `list_commits` is called
+    and `on_change` is given the branches whose commit `version` differs from the previous listing, so the first user
+    after a model update finds it received and aggregated already. Views read the latest commits from the poller
+    while its last listing is recent, instead of listing the branches themselves.
+
+    `subscribe(callback)` should block for as long as the subscription lives; when it is None or fails, the poller only
+    polls.
+    """
+
+    def __init__(
+        self,
+        list_commits: Callable[[], dict],
+        on_change: Callable[[dict], None],
+        interval: float = POLL_INTERVAL,
+        subscribe: Callable[[Callable[[], None]], None] | None = None,
+        version: Callable = lambda commit: commit,
+    ):
+        self.list_commits = list_commits
+        self.on_change = on_change
+        self.interval = interval
+        self.subscribe = subscribe
+        self.version = version
+        self.stats = PollerStats()
+        self._commits = None
+        self._polled_at = None
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        """Start the poller thread, unless it runs already or the interval is 0."""
+        with self._lock:
+            if self.interval <= 0 or self.running:
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="speckle-poller", daemon=True)
+            self._thread.start()
+        if self.subscribe is not None:
+            threading.Thread(target=self._subscribe, name="speckle-subscription", daemon=True).start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        if self.running:
+            self._thread.join()
+
+    def wake(self):
+        """Poll now instead of at the end of the interval."""
+        self._wake.set()
+
+    def expire(self):
+        """Stop serving the last listing, e.g. after a commit was made, and poll now."""
+        with self._lock:
+            self._polled_at = None
+        self.wake()
+
+    def latest(self) -> dict | None:
+        """The commits of the last listing, or None when the poller isn't running or hasn't listed recently."""
+        with self._lock:
+            if not self.running or self._polled_at is None or time.monotonic() - self._polled_at > 2 * self.interval:
+                return None
+            return self._commits
+
+    def poll(self) -> dict:
+        """List the commits once and warm the branches that changed since the previous listing."""
+        commits = self.list_commits()
+        with self._lock:
+            previous = self._commits or {}
+            self._commits, self._polled_at = commits, time.monotonic()
+        self.stats.polls += 1
+        changed = {
+            name: commit
+            for name, commit in commits.items()
+            if name not in previous or self.version(previous[name]) != self.version(commit)
+        }
+        if changed:
+            self.stats.changes += len(changed)
+            self.on_change(changed)
+        return changed
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.poll()
+            except Exception as exception:
+                self.stats.errors += 1
+                logger.warning("polling the Speckle branches failed: %r", exception)
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+    def _subscribe(self):
+        def on_event():
+            self.stats.subscription_events += 1
+            self.wake()
+
+        try:
+            self.subscribe(on_event)
+        except Exception as exception:
+            logger.info("Speckle subscription unavailable, polling every %g s: %r", self.interval, exception)
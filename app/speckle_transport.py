@@ -0,0 +1,144 @@
+import os
+import threading
+from dataclasses import asdict
+from dataclasses import dataclass
+
+import requests
+from requests.adapters import HTTPAdapter
+from specklepy.api.client import SpeckleClient
+from specklepy.transports.abstract_transport import AbstractTransport
+from specklepy.transports.server import ServerTransport
+from specklepy.transports.server.batch_sender import BatchSender
+from urllib3.util.retry import Retry
+
+POOL_MAX_CONNECTIONS = int(os.environ.get("SPECKLE_POOL_MAX_CONNECTIONS", 16))
+UPLOAD_BATCH_MB = float(os.environ.get("SPECKLE_UPLOAD_BATCH_MB", 2))
+RETRIES = Retry(
+    total=int(os.environ.get("SPECKLE_RETRIES", 4)),
+    backoff_factor=0.5,
+    status_forcelist=(429, 500, 502, 503, 504),
+    # Object uploads and downloads are content-addressed, so repeating the POSTs is safe
+    allowed_methods=frozenset({"GET", "POST"}),
+)
+
+
+@dataclass
+class TransportStats:
+    requests: int = 0
+    connections_opened: int = 0
+    bytes_sent: int = 0
+    bytes_received: int = 0
+
+    @property
+    def connections_reused(self) -> int:
+        return max(self.requests - self.connections_opened, 0)
+
+    def as_dict(self):
+        return {**asdict(self), "connections_reused": self.connections_reused}
+
+
+class _PooledBatchSender(BatchSender):
+    """`BatchSender` whose upload threads post through the pool's session instead of opening one each."""
+
+    def __init__(self, session: requests.Session, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._pooled_session = session
+
+    def _bg_send_batch(self, session, batch):
+        return super()._bg_send_batch(self._pooled_session, batch)
+
+
+class _CountingTransport:
+    """Wraps the target transport of a download to count the bytes of the objects written to it."""
+
+    def __init__(self, transport: AbstractTransport, pool: "TransportPool"):
+        self._transport = transport
+        self._pool = pool
+
+    def __getattr__(self, name):
+        return getattr(self._transport, name)
+
+    def save_object(self, id: str, serialized_object: str):
+        self._pool.count_received(len(serialized_object))
+        self._transport.save_object(id, serialized_object)
+
+
+class PooledServerTransport(ServerTransport):
+    """`ServerTransport` that downloads and uploads over a session shared by all transports of the same stream."""
+
+    def __init__(self, pool: "TransportPool", client: SpeckleClient, stream_id: str):
+        super().__init__(stream_id=stream_id, client=client)
+        self._pool = pool
+        self.session = pool.session(self.url, self.account.token)
+        self._batch_sender = _PooledBatchSender(
+            self.session, self.url, self.stream_id, self.account.token, max_batch_size_mb=UPLOAD_BATCH_MB
+        )
+
+    def copy_object_and_children(self, id: str, target_transport: AbstractTransport) -> str:
+        return super().copy_object_and_children(id, _CountingTransport(target_transport, self._pool))
+
+    def get_object(self, id: str) -> str:
+        """Download one object without its children, through the server's `single` endpoint."""
+        response = self.session.get(f"{self.url}/objects/{self.stream_id}/{id}/single")
+        response.raise_for_status()
+        self._pool.count_received(len(response.content))
+        return response.text
+
+
+class TransportPool:
+    """
+    Process-wide pool of keep-alive HTTP sessions for Speckle object transfers, one per server and token.
+
+    Transports are cheap to create and are handed out per call and stream (their batch senders aren't thread-safe), but
+    they all share the session of their server, so connections and TLS sessions are reused across calls, streams and
+    threads. Downloads go through the bulk `getobjects` endpoint and uploads in batches of `UPLOAD_BATCH_MB`. Transient
+    errors are retried with exponential backoff by the session's adapter.
+    """
+
+    def __init__(self, max_connections: int = POOL_MAX_CONNECTIONS, retries: Retry = RETRIES):
+        self.max_connections = max_connections
+        self.retries = retries
+        self._stats = TransportStats()
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def transport(self, client: SpeckleClient, stream_id: str) -> PooledServerTransport:
+        return PooledServerTransport(self, client, stream_id)
+
+    def session(self, url: str, token: str) -> requests.Session:
+        with self._lock:
+            session = self._sessions.get((url, token))
+            if session is None:
+                session = requests.Session()
+                session.headers.update({"Accept": "text/plain", "Authorization": f"Bearer {token}"})
+                adapter = HTTPAdapter(
+                    pool_connections=self.max_connections, pool_maxsize=self.max_connections, max_retries=self.retries
+                )
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                session.hooks["response"].append(self._count_response)
+                self._sessions[(url, token)] = session
+        return session
+
+    @property
+    def stats(self) -> TransportStats:
+        # Requests and connections are read from the urllib3 pools, bytes are counted as they pass
+        stats = TransportStats(bytes_sent=self._stats.bytes_sent, bytes_received=self._stats.bytes_received)
+        for session in list(self._sessions.values()):
+            for adapter in set(session.adapters.values()):
+                for key in list(adapter.poolmanager.pools.keys()):
+                    connection_pool = adapter.poolmanager.pools.get(key)
+                    if connection_pool is not None:
+                        stats.requests += connection_pool.num_requests
+                        stats.connections_opened += connection_pool.num_connections
+        return stats
+
+    def count_received(self, size: int):
+        with self._lock:
+            self._stats.bytes_received += size
+
+    def _count_response(self, response: requests.Response, *args, **kwargs):
+        body = response.request.body
+        if isinstance(body, (bytes, str)):
+            with self._lock:
+                self._stats.bytes_sent += len(body)
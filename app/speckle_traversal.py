@@ -0,0 +1,40 @@
+import json
+from typing import Iterator
+
+from specklepy.transports.abstract_transport import AbstractTransport
+
+
+def iter_serialized_objects(
+    transport: AbstractTransport, value, speckle_type: str | None = None, attribute: str | None = None
+) -> Iterator[dict]:
+    """
+    Walk serialized Speckle objects depth-first with an explicit stack, yielding them as plain dicts.
+
+    Nothing is recomposed into `Base` objects: detached children (references) are read from `transport` one at a time
+    when the walk reaches them, so only the object being visited and the pending stack are held in memory. Objects are
+    yielded when they match `speckle_type` and have `attribute` (either filter may be left out), and matching objects
+    are not descended into, so the walk stays cheap when the objects of interest carry large geometry lists.
+    """
+    stack = [value]
+    while stack:
+        value = stack.pop()
+        if isinstance(value, list):
+            stack.extend(item for item in reversed(value) if isinstance(item, (list, dict)))
+            continue
+        if not isinstance(value, dict):
+            continue
+        if value.get("speckle_type") == "reference":
+            stack.append(json.loads(transport.get_object(value["referencedId"])))
+            continue
+        if (
+            "speckle_type" in value
+            and (speckle_type is None or value["speckle_type"] == speckle_type)
+            and (attribute is None or attribute in value)
+        ):
+            yield value
+            continue
+        stack.extend(
+            member
+            for key, member in reversed(value.items())
+            if not key.startswith("__") and isinstance(member, (list, dict))
+        )
@@ -0,0 +1,227 @@
+import contextvars
+import cProfile
+import io
+import itertools
+import json
+import math
+import os
+import pstats
+import random
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from collections import deque
+from contextlib import contextmanager
+from functools import wraps
+from typing import Callable
+
+# Fraction of view calls that are run under cProfile, e.g. TELEMETRY_PROFILE_RATE=0.05 to profile one call in twenty
+PROFILE_RATE = float(os.environ.get("TELEMETRY_PROFILE_RATE", 0))
+MAX_SPANS = int(os.environ.get("TELEMETRY_MAX_SPANS", 1000))
+MAX_PROFILES = int(os.environ.get("TELEMETRY_MAX_PROFILES", 10))
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+METRIC_PREFIX = "viktor_app"
+
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def cumulative(self) -> list[tuple[str, int]]:
+        """`(le, count)` pairs of the Prometheus buckets, each counting the observations up to `le`."""
+        bounds = [f"{bucket:g}" for bucket in self.buckets] + ["+Inf"]
+        return list(zip(bounds, itertools.accumulate(self.counts)))
+
+    def as_dict(self):
+        return {"count": self.count, "sum": self.sum, "buckets": dict(self.cumulative())}
+
+
+def _label_key(labels: dict) -> tuple:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _format_labels(labels: tuple, **extra) -> str:
+    pairs = list(labels) + [(key, str(value)) for key, value in extra.items()]
+    if not pairs:
+        return ""
+    escaped = (value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{key}="{value}"' for (key, _), value in zip(pairs, escaped)) + "}"
+
+
+def _format_value(value: float) -> str:
+    """Write a sample value with all its digits; `:g` would round byte and element counts to 6 significant digits."""
+    if math.isnan(value):
+        return "NaN"
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Telemetry:
+    """
+    In-process counters, latency histograms and spans of the app's hot paths.
+
+    A span times a block and is recorded, with its parent, in a ring buffer of the last `max_spans` spans; its duration
+    is also added to the `span_duration_seconds` histogram of its name. The context of a span is a context variable,
+    so operations handed to `run_concurrently` nest under the span that started them. Views are wrapped with `view`,
+    which keeps a latency histogram per view and runs a `profile_rate` fraction of the calls under cProfile.
+
+    Everything is exported as JSON or in the Prometheus text format, together with the stats of the registered gauges.
+    """
+
+    def __init__(self, max_spans: int = MAX_SPANS, profile_rate: float = PROFILE_RATE):
+        self.profile_rate = profile_rate
+        self.counters = defaultdict(float)
+        self.histograms = defaultdict(Histogram)
+        self.spans = deque(maxlen=max_spans)
+        self.profiles = deque(maxlen=MAX_PROFILES)
+        self.gauges = {}
+        self._span_ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def count(self, name: str, value: float = 1, **labels):
+        with self._lock:
+            self.counters[(name, _label_key(labels))] += value
+
+    def observe(self, name: str, value: float, **labels):
+        with self._lock:
+            self.histograms[(name, _label_key(labels))].observe(value)
+
+    def register_gauges(self, name: str, collect: Callable[[], dict]):
+        """Export the numbers returned by `collect`, e.g. the `as_dict()` of cache stats, as gauges `<name>_<key>`."""
+        self.gauges[name] = collect
+
+    @contextmanager
+    def span(self, name: str, **attributes):
+        parent = _current_span.get()
+        record = {
+            "id": next(self._span_ids),
+            "parent": parent["id"] if parent else None,
+            "name": name,
+            "thread": threading.current_thread().name,
+            "start": time.time(),
+            "attributes": attributes,
+        }
+        token = _current_span.set(record)
+        start = time.perf_counter()
+        try:
+            yield record
+        except Exception as exception:
+            record["error"] = repr(exception)
+            self.count("span_errors_total", span=name)
+            raise
+        finally:
+            _current_span.reset(token)
+            record["duration"] = time.perf_counter() - start
+            self.observe("span_duration_seconds", record["duration"], span=name)
+            with self._lock:
+                self.spans.append(record)
+
+    @contextmanager
+    def profile(self, name: str):
+        """Run the block under cProfile for a `profile_rate` fraction of the calls, keeping the top functions."""
+        if self.profile_rate <= 0 or random.random() >= self.profile_rate:
+            yield
+            return
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Another profiler is active on this thread already
+            yield
+            return
+        try:
+            yield
+        finally:
+            profiler.disable()
+            output = io.StringIO()
+            pstats.Stats(profiler, stream=output).sort_stats("cumulative").print_stats(30)
+            with self._lock:
+                self.profiles.append({"name": name, "time": time.time(), "stats": output.getvalue()})
+
+    def view(self, function: Callable) -> Callable:
+        """Wrap a controller view: time it in a span and the `view_duration_seconds` histogram, and sample profiles."""
+        name = function.__name__
+
+        @wraps(function)
+        def traced(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                with self.span(f"view.{name}"), self.profile(name):
+                    return function(*args, **kwargs)
+            finally:
+                self.observe("view_duration_seconds", time.perf_counter() - start, view=name)
+
+        return traced
+
+    def reset(self):
+        with self._lock:
+            self.counters.clear()
+            self.histograms.clear()
+            self.spans.clear()
+            self.profiles.clear()
+
+    def _gauge_values(self) -> dict[str, dict]:
+        values = {}
+        for name, collect in self.gauges.items():
+            try:
+                values[name] = {key: value for key, value in collect().items() if isinstance(value, (int, float))}
+            except Exception as exception:
+                values[name] = {"error": repr(exception)}
+        return values
+
+    def export_json(self) -> str:
+        with self._lock:
+            snapshot = {
+                "counters": [
+                    {"name": name, "labels": dict(labels), "value": value}
+                    for (name, labels), value in self.counters.items()
+                ],
+                "histograms": [
+                    {"name": name, "labels": dict(labels), **histogram.as_dict()}
+                    for (name, labels), histogram in self.histograms.items()
+                ],
+                "spans": list(self.spans),
+                "profiles": list(self.profiles),
+            }
+        snapshot["gauges"] = self._gauge_values()
+        return json.dumps(snapshot, default=str)
+
+    def export_prometheus(self) -> str:
+        lines = []
+        with self._lock:
+            counters = sorted(self.counters.items())
+            histograms = sorted(self.histograms.items(), key=lambda item: item[0])
+        for name in dict.fromkeys(name for (name, _), _ in counters):
+            lines.append(f"# TYPE {METRIC_PREFIX}_{name} counter")
+            for (_, labels), value in (item for item in counters if item[0][0] == name):
+                lines.append(f"{METRIC_PREFIX}_{name}{_format_labels(labels)} {_format_value(value)}")
+        for name in dict.fromkeys(name for (name, _), _ in histograms):
+            lines.append(f"# TYPE {METRIC_PREFIX}_{name} histogram")
+            for (_, labels), histogram in (item for item in histograms if item[0][0] == name):
+                for le, count in histogram.cumulative():
+                    lines.append(f"{METRIC_PREFIX}_{name}_bucket{_format_labels(labels, le=le)} {count}")
+                lines.append(f"{METRIC_PREFIX}_{name}_sum{_format_labels(labels)} {_format_value(histogram.sum)}")
+                lines.append(f"{METRIC_PREFIX}_{name}_count{_format_labels(labels)} {histogram.count}")
+        for gauge, values in self._gauge_values().items():
+            for key, value in values.items():
+                if isinstance(value, (int, float)):
+                    lines.append(f"# TYPE {METRIC_PREFIX}_{gauge}_{key} gauge")
+                    lines.append(f"{METRIC_PREFIX}_{gauge}_{key} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+telemetry = Telemetry()
@@ -0,0 +1,24 @@
+import hashlib
+import json
+import os
+
+from app.speckle_cache import LRUCache
+
+VIEW_CACHE_MAX_ENTRIES = int(os.environ.get("VIEW_CACHE_MAX_ENTRIES", 64))
+VIEW_CACHE_MAX_MB = float(os.environ.get("VIEW_CACHE_MAX_MB", 64))
+
+view_results = LRUCache(VIEW_CACHE_MAX_ENTRIES, max_bytes=int(VIEW_CACHE_MAX_MB * 1000 * 1000))
+
+
+def view_result_key(view_name: str, entity_id: int, children, model_versions: dict[str, str]) -> str:
+    """
+    Key a view result on everything it is computed from: the entity, the saved params of each of its children and the
+    object ids of the model commits it reads. Any saved bid or new model commit therefore yields a new key.
+    """
+    digest = hashlib.sha256()
+    digest.update(f"{view_name}:{entity_id}".encode())
+    for child in sorted(children, key=lambda child: child.id):
+        digest.update(f"{child.id}:{child.name}:".encode())
+        digest.update(json.dumps(child.last_saved_params, sort_keys=True, default=str).encode())
+    digest.update(json.dumps(model_versions, sort_keys=True).encode())
+    return digest.hexdigest()
@@ -0,0 +1,74 @@
+import itertools
+import os
+
+import pytest
+
+from app import speckle_functions
+from app.my_folder import controller as my_folder_controller
+from app.quantity_summary import SummaryStore
+from app.speckle_cache import CACHE_MAX_ENTRIES
+from app.speckle_cache import LRUCache
+from app.speckle_cache import SpeckleObjectCache
+from app.speckle_cache import TTLCache
+from app.speckle_poller import BranchPoller
+from app.view_cache import view_results
+from tests.fake_speckle import FakeSpeckleServer
+from tests.fake_speckle import FakeViktorAPI
+from tests.fake_speckle import synthetic_children
+from tests.fake_speckle import synthetic_model
+from tests.fake_speckle import type_names
+
+# Size of the synthetic models, e.g. BENCHMARK_MODEL_SIZE=100000 to size workers for large models
+MODEL_SIZE = int(os.environ.get("BENCHMARK_MODEL_SIZE", 1_000))
+TYPE_COUNT = int(os.environ.get("BENCHMARK_TYPE_COUNT", 20))
+CONTRACTOR_COUNT = int(os.environ.get("BENCHMARK_CONTRACTOR_COUNT", 20))
+
+
+@pytest.fixture
+def reset_caches(monkeypatch, tmp_path):
+    """Return a function that empties every cache, so the next call pays the full receive-and-aggregate cost."""
+    cache_directories = (tmp_path / f"cache-{i}" for i in itertools.count())
+
+    def reset():
+        cache_directory = str(next(cache_directories))
+        monkeypatch.setattr(speckle_functions, "object_cache", SpeckleObjectCache(base_path=cache_directory))
+        monkeypatch.setattr(speckle_functions, "snapshot_cache", LRUCache(CACHE_MAX_ENTRIES))
+        monkeypatch.setattr(speckle_functions, "summary_store", SummaryStore(base_path=cache_directory))
+        monkeypatch.setattr(speckle_functions, "name_index", TTLCache(speckle_functions.NAME_INDEX_TTL))
+        monkeypatch.setattr(speckle_functions, "published_summaries", set())
+        view_results.clear()
+
+    reset()
+    return reset
+
+
+@pytest.fixture
+def fake_speckle(monkeypatch, reset_caches) -> FakeSpeckleServer:
+    """Point `app.speckle_functions` at a local server seeded with synthetic concrete and lighting commits."""
+    server = FakeSpeckleServer()
+    server.commit("concrete", synthetic_model("concrete", MODEL_SIZE, TYPE_COUNT))
+    server.commit("lighting", synthetic_model("lighting", MODEL_SIZE, TYPE_COUNT, seed=1))
+    monkeypatch.setattr(speckle_functions, "get_client", lambda: server.client)
+    monkeypatch.setattr(speckle_functions, "new_server_transport", server.transport)
+    monkeypatch.setattr(speckle_functions, "stream_id", server.stream_id)
+    # The tests poll explicitly rather than on a background thread
+    poller = BranchPoller(
+        speckle_functions.list_latest_commits, speckle_functions.warm_categories, interval=0, version=lambda c: c[0]
+    )
+    monkeypatch.setattr(speckle_functions, "poller", poller)
+    return server
+
+
+@pytest.fixture
+def viktor_api(monkeypatch, fake_speckle) -> FakeViktorAPI:
+    """Point the folder controller at a fake VIKTOR API, whose children bid on every type of the synthetic models."""
+    api = FakeViktorAPI(
+        synthetic_children(CONTRACTOR_COUNT, type_names("concrete", TYPE_COUNT), type_names("lighting", TYPE_COUNT))
+    )
+    monkeypatch.setattr(my_folder_controller, "API", lambda: api)
+    return api
+
+
+@pytest.fixture
+def children(viktor_api):
+    return viktor_api.children
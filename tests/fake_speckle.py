@@ -0,0 +1,164 @@
+"""
+Local stand-in for the Speckle server, so the Speckle helpers and views can be benchmarked offline.
+
+`FakeSpeckleServer` keeps one stream with branches of commits in memory. Its `client` answers the branch and commit
+calls made by `app.speckle_functions`, and `transport()` builds a transport with the interface of `ServerTransport`
+that reads and writes the server's object store.
+"""
+
+import itertools
+import json
+import threading
+import time
+from types import SimpleNamespace
+
+import numpy as np
+from munch import Munch
+from specklepy.api import operations
+from specklepy.objects import Base
+from specklepy.transports.memory import MemoryTransport
+
+from app.categories import VOLUME_FIELD
+
+
+class FakeServerTransport(MemoryTransport):
+    def __init__(self, server: "FakeSpeckleServer"):
+        super().__init__(name="FakeServerTransport")
+        self.objects = server.objects
+
+    def copy_object_and_children(self, id: str, target_transport) -> str:
+        root = self.objects[id]
+        target_transport.begin_write()
+        for child_id in json.loads(root).get("__closure", {}):
+            target_transport.save_object(child_id, self.objects[child_id])
+        target_transport.save_object(id, root)
+        target_transport.end_write()
+        return root
+
+
+class FakeSpeckleServer:
+    def __init__(self, stream_id: str = "fake-stream"):
+        self.stream_id = stream_id
+        self.objects = {}
+        self.branches = {"main": []}
+        self._commit_ids = itertools.count(1)
+        self.client = SimpleNamespace(
+            branch=SimpleNamespace(get=self.get_branch, list=self.list_branches, create=self.create_branch),
+            commit=SimpleNamespace(create=self.create_commit),
+        )
+
+    def transport(self, **kwargs) -> FakeServerTransport:
+        return FakeServerTransport(self)
+
+    def commit(self, branch_name: str, base: Base) -> str:
+        object_id = operations.send(base, transports=[self.transport()], use_default_cache=False)
+        return self.create_commit(self.stream_id, object_id, branch_name)
+
+    def create_commit(
+        self, stream_id, object_id, branch_name="main", message="", source_application="python", **kwargs
+    ):
+        commit = SimpleNamespace(id=f"commit{next(self._commit_ids)}", referencedObject=object_id, message=message)
+        self.branches.setdefault(branch_name, []).insert(0, commit)
+        return commit.id
+
+    def create_branch(self, stream_id, name, description="No description provided"):
+        self.branches.setdefault(name, [])
+        return name
+
+    def get_branch(self, stream_id, name, commits_limit=10):
+        return SimpleNamespace(name=name, commits=SimpleNamespace(items=self.branches[name][:commits_limit]))
+
+    def list_branches(self, stream_id, branches_limit=10, commits_limit=10):
+        return [self.get_branch(stream_id, name, commits_limit) for name in list(self.branches)[:branches_limit]]
+
+
+def type_names(category: str, type_count: int) -> list[str]:
+    return [f"{category.capitalize()} type {i}" for i in range(type_count)]
+
+
+def synthetic_model(category: str, element_count: int, type_count: int = 20, seed: int = 0) -> Base:
+    """Build a commit like the exported models: a root holding `@<Category>`, which holds lists of named meshes."""
+    rng = np.random.default_rng(seed)
+    names = type_names(category, type_count)
+    category_base = Base()
+    for group, indices in enumerate(np.array_split(np.arange(element_count), min(10, element_count))):
+        meshes = []
+        for index in indices:
+            mesh = Base(Name=names[rng.integers(type_count)], vertices=rng.uniform(0, 10, 24).round(3).tolist())
+            mesh.applicationId = f"{category}-{index}"
+            mesh[VOLUME_FIELD] = float(rng.uniform(0.1, 10.0))
+            meshes.append(mesh)
+        category_base[f"Group {group}"] = meshes
+    root = Base()
+    root[f"@{category.capitalize()}"] = category_base
+    return root
+
+
+class LazyEntityList:
+    """Like the `EntityList` of `viktor.api_v1`: the children are only requested when the list is first read."""
+
+    def __init__(self, children: list, delay: float = 0.0):
+        self.children = children
+        self.delay = delay
+        self.read_by = None
+        self.read_at = None
+
+    def _load(self) -> list:
+        if self.read_by is None:
+            time.sleep(self.delay)
+            self.read_by = threading.current_thread().name
+            self.read_at = time.time()
+        return self.children
+
+    def __iter__(self):
+        return iter(self._load())
+
+    def __len__(self):
+        return len(self._load())
+
+    def __getitem__(self, index):
+        return self._load()[index]
+
+
+class FakeViktorAPI:
+    """Stand-in for `viktor.api_v1.API`, answering `get_entity_children` with lazy lists taking `delay` s to load."""
+
+    def __init__(self, children: list, delay: float = 0.0):
+        self.children = children
+        self.delay = delay
+        self.entity_lists = []
+
+    def get_entity_children(self, entity_id) -> LazyEntityList:
+        entity_list = LazyEntityList(self.children, self.delay)
+        self.entity_lists.append(entity_list)
+        return entity_list
+
+
+def synthetic_children(contractor_count: int, concrete_types: list[str], lighting_types: list[str], seed: int = 0):
+    """Contractor entities as returned by `API().get_entity_children`, each bidding on every type."""
+    rng = np.random.default_rng(seed)
+    return [
+        Munch(
+            id=contractor,
+            name=f"Contractor {contractor}",
+            last_saved_params=Munch(
+                constructor_location=Munch(lat=float(rng.uniform(36, 43)), lon=float(rng.uniform(-9, 3))),
+                concrete=[
+                    Munch(
+                        concrete_type=name,
+                        pre_cast_option=bool(rng.integers(2)),
+                        lead_time=int(rng.integers(1, 20)),
+                        price_per_unit=float(rng.uniform(80, 200)),
+                    )
+                    for name in concrete_types
+                ],
+                lighting=[
+                    Munch(
+                        lighting_type=name, lead_time=int(rng.integers(1, 20)), price_per_unit=float(rng.uniform(5, 50))
+                    )
+                    for name in lighting_types
+                ],
+            ),
+        )
+        for contractor in range(contractor_count)
+    ]
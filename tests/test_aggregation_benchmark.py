@@ -0,0 +1,60 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.model_snapshot import ModelSnapshot
+
+ELEMENT_COUNTS = [1_000, 10_000, 100_000, 1_000_000]
+TYPE_COUNT = 200
+# Sizes above this are only benchmarked when explicitly asked for, e.g. BENCHMARK_MAX_ELEMENTS=1000000
+MAX_ELEMENTS = int(os.environ.get("BENCHMARK_MAX_ELEMENTS", 10_000))
+# The one-key-dict frame needs elements × types floats, which doesn't fit in memory beyond this size
+MAX_LEGACY_ELEMENTS = 100_000
+
+
+def synthetic_quantities(element_count: int, type_count: int = TYPE_COUNT):
+    rng = np.random.default_rng(0)
+    names = np.array([f"Type {i}" for i in range(type_count)], dtype=object)[rng.integers(0, type_count, element_count)]
+    volumes = rng.uniform(0.1, 10.0, element_count)
+    return names, volumes
+
+
+def snapshot_totals(names, volumes):
+    """The production path: build the columns of a commit once, then sum them per type."""
+    return ModelSnapshot("object", names, volumes, np.ones(len(names)), np.arange(len(names))).totals("volume")
+
+
+def legacy_aggregate(names, volumes):
+    return pd.DataFrame([{name: volume} for name, volume in zip(names, volumes)]).sum()
+
+
+def skip_above(element_count: int, limit: int):
+    if element_count > limit:
+        pytest.skip(f"{element_count} elements is above the benchmark limit of {limit}")
+
+
+@pytest.mark.parametrize("element_count", ELEMENT_COUNTS)
+def test_snapshot_totals(benchmark, element_count):
+    skip_above(element_count, MAX_ELEMENTS)
+    names, volumes = synthetic_quantities(element_count)
+    totals = benchmark(snapshot_totals, names, volumes)
+    assert totals.sum() == pytest.approx(volumes.sum())
+
+
+@pytest.mark.parametrize("element_count", ELEMENT_COUNTS)
+def test_legacy_dataframe_aggregate(benchmark, element_count):
+    skip_above(element_count, min(MAX_ELEMENTS, MAX_LEGACY_ELEMENTS))
+    names, volumes = synthetic_quantities(element_count)
+    totals = benchmark.pedantic(legacy_aggregate, args=(names, volumes), rounds=3)
+    assert totals.sum() == pytest.approx(volumes.sum())
+
+
+def test_aggregations_agree():
+    names, volumes = synthetic_quantities(2_000, type_count=50)
+    expected = legacy_aggregate(names, volumes)
+    totals = snapshot_totals(names, volumes)
+    pd.testing.assert_series_equal(
+        totals.sort_index(), expected.sort_index(), check_names=False, check_index_type=False
+    )
@@ -0,0 +1,115 @@
+from itertools import combinations
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.award import award_bids
+from app.bid_table import BidTable
+from tests.fake_speckle import synthetic_children
+from tests.fake_speckle import type_names
+
+
+def random_bid_table(seed: int, contractor_count: int = 6, type_count: int = 4) -> BidTable:
+    """Bids of a few contractors on a few concrete and lighting types, with some types left without a bid."""
+    rng = np.random.default_rng(seed)
+    rows = [
+        (category, f"Contractor {contractor}", f"{category} {type_index}")
+        for category in ("concrete", "lighting")
+        for contractor in range(contractor_count)
+        for type_index in range(type_count)
+        if rng.random() < 0.7
+    ]
+    category, contractor, type_name = (list(column) for column in zip(*rows))
+    return BidTable(
+        category,
+        contractor,
+        type_name,
+        lead_time=rng.integers(1, 20, len(rows)),
+        unit_price=rng.uniform(10, 100, len(rows)).round(2),
+        quantity=rng.uniform(1, 10, len(rows)).round(2),
+        pre_cast_option=rng.random(len(rows)) < 0.5,
+    )
+
+
+def brute_force(bid_table: BidTable, max_lead_time, max_suppliers, require_pre_cast) -> tuple[int, float]:
+    """Number of unawarded items and total cost of the best award, by trying every set of suppliers."""
+    costs = {}
+    for row in range(len(bid_table)):
+        if max_lead_time is not None and bid_table.lead_time[row] > max_lead_time:
+            continue
+        if require_pre_cast and bid_table.category[row] == "concrete" and not bid_table.pre_cast_option[row]:
+            continue
+        item = (bid_table.category[row], bid_table.type_name[row])
+        costs.setdefault(item, {})[bid_table.contractor[row]] = bid_table.total[row]
+    items = set(zip(bid_table.category, bid_table.type_name))
+    contractors = sorted({contractor for bids in costs.values() for contractor in bids})
+    best = None
+    for size in range(1, min(max_suppliers or len(contractors), len(contractors)) + 1):
+        for suppliers in combinations(contractors, size):
+            awarded = [
+                min(bids[supplier] for supplier in suppliers if supplier in bids)
+                for bids in costs.values()
+                if bids.keys() & set(suppliers)
+            ]
+            key = (len(items) - len(awarded), sum(awarded))
+            best = key if best is None or key < best else best
+    return best or (len(items), 0.0)
+
+
+@pytest.mark.parametrize("seed", range(20))
+@pytest.mark.parametrize("max_suppliers", [None, 1, 2, 3])
+def test_award_matches_brute_force(seed, max_suppliers):
+    bid_table = random_bid_table(seed)
+    max_lead_time, require_pre_cast = (None, False) if seed % 2 else (12, True)
+    award = award_bids(
+        bid_table, max_lead_time=max_lead_time, max_suppliers=max_suppliers, require_pre_cast=require_pre_cast
+    )
+    unawarded, total_cost = brute_force(bid_table, max_lead_time, max_suppliers, require_pre_cast)
+    assert award.method == "exact"
+    assert len(award.unawarded) == unawarded
+    assert award.total_cost == pytest.approx(total_cost)
+    assert len(award.suppliers) <= (max_suppliers or len(award.suppliers))
+
+
+def test_award_respects_lead_time_and_pre_cast():
+    bid_table = random_bid_table(0, contractor_count=10)
+    award = award_bids(bid_table, max_lead_time=10, require_pre_cast=True)
+    pre_cast = {
+        (contractor, type_name)
+        for contractor, type_name, option in zip(bid_table.contractor, bid_table.type_name, bid_table.pre_cast_option)
+        if option
+    }
+    assert award.assignments
+    assert all(assignment.lead_time <= 10 for assignment in award.assignments)
+    assert all(
+        (assignment.contractor, assignment.type_name) in pre_cast
+        for assignment in award.assignments
+        if assignment.category == "concrete"
+    )
+
+
+def test_award_charges_transport_per_item():
+    bid_table = random_bid_table(0, contractor_count=1)
+    distances = {"Contractor 0": 100.0}
+    award = award_bids(bid_table, distances=distances, transport_cost_per_km=2)
+    assert len(award.assignments) > 1
+    for assignment in award.assignments:
+        assert assignment.cost == pytest.approx(assignment.unit_price * assignment.quantity + 200)
+    assert award.total_cost == pytest.approx(award_bids(bid_table).total_cost + 200 * len(award.assignments))
+
+
+@pytest.mark.parametrize("max_suppliers", [None, 2, 10])
+def test_award_solver(benchmark, max_suppliers):
+    # Hundreds of contractors × hundreds of types, independent of the model size
+    children = synthetic_children(300, type_names("concrete", 200), type_names("lighting", 100))
+    bid_table = BidTable.from_children(
+        children,
+        quantities={
+            category: pd.Series(1.0, index=type_names(category, count))
+            for category, count in (("concrete", 200), ("lighting", 100))
+        },
+    )
+    award = benchmark(award_bids, bid_table, max_lead_time=15, max_suppliers=max_suppliers)
+    assert len(award.assignments) + len(award.unawarded) == 300
+    assert len(award.suppliers) <= (max_suppliers or 300)
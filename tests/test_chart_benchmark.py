@@ -0,0 +1,94 @@
+import json
+import os
+
+import numpy as np
+import plotly.graph_objects as go
+import pytest
+from plotly.subplots import make_subplots
+
+from app.plotly_json import dumps
+from app.plotly_json import grouped_bar_subplots
+from app.plotly_json import top_contractors
+
+CONTRACTOR_COUNT = int(os.environ.get("BENCHMARK_CHART_CONTRACTORS", 300))
+TYPE_COUNT = int(os.environ.get("BENCHMARK_CHART_TYPES", 200))
+
+
+def synthetic_panels(contractor_count: int = CONTRACTOR_COUNT, type_count: int = TYPE_COUNT) -> list[dict]:
+    rng = np.random.default_rng(0)
+    return [
+        {
+            "title": f"{category} Prices by Contractor and Type",
+            "x_title": f"{category} Type",
+            "y_title": f"{category} Price",
+            "contractors": [f"Contractor {i}" for i in range(contractor_count)],
+            "types": [f"{category} type {i}" for i in range(type_count)],
+            # Not every contractor bids on every type
+            "matrix": rng.uniform(100, 10_000, (contractor_count, type_count)) * (rng.random((1, type_count)) < 0.8),
+        }
+        for category in ("Concrete", "Lighting")
+    ]
+
+
+def legacy_figure_json(panels: list[dict]) -> str:
+    """The `graph_objects` path the price comparison view used before, one validated `go.Bar` per contractor."""
+    fig = make_subplots(rows=len(panels), cols=1, subplot_titles=[panel["title"] for panel in panels])
+    for row, panel in enumerate(panels, start=1):
+        for contractor, prices in zip(panel["contractors"], panel["matrix"]):
+            fig.add_trace(
+                go.Bar(x=panel["types"], y=prices.tolist(), name=contractor, legendgroup=contractor), row=row, col=1
+            )
+        fig.update_xaxes(title_text=panel["x_title"], row=row, col=1)
+        fig.update_yaxes(title_text=panel["y_title"], row=row, col=1)
+    fig.update_layout(barmode="group", height=450 * len(panels))
+    return fig.to_json()
+
+
+def direct_figure_json(panels: list[dict], top_n: int | None = None) -> str:
+    return dumps(grouped_bar_subplots(panels, top_n=top_n))
+
+
+def test_legacy_figure_json(benchmark):
+    panels = synthetic_panels()
+    payload = benchmark.pedantic(legacy_figure_json, args=(panels,), rounds=3)
+    benchmark.extra_info["payload_kb"] = round(len(payload) / 1000, 1)
+
+
+@pytest.mark.parametrize("top_n", [None, 20])
+def test_direct_figure_json(benchmark, top_n):
+    panels = synthetic_panels()
+    payload = benchmark(direct_figure_json, panels, top_n)
+    benchmark.extra_info["payload_kb"] = round(len(payload) / 1000, 1)
+    figure = go.Figure(json.loads(payload))
+    assert len(figure.data) == 2 * (top_n + 1 if top_n else CONTRACTOR_COUNT)
+
+
+def test_direct_figure_is_smaller():
+    panels = synthetic_panels(50, 40)
+    legacy = json.loads(legacy_figure_json(panels))
+    direct = json.loads(direct_figure_json(panels))
+    assert len(json.dumps(direct)) * 3 < len(json.dumps(legacy))
+    # Same bars, with the type names as tick labels instead of x values
+    assert [trace["name"] for trace in direct["data"]] == [trace["name"] for trace in legacy["data"]]
+    assert direct["data"][0]["y"] == pytest.approx(legacy["data"][0]["y"], abs=0.5)
+    assert direct["layout"]["xaxis"]["ticktext"] == panels[0]["types"]
+
+
+def test_top_contractors():
+    matrix = np.array([[1.0, 0.0], [2.0, 2.0], [4.0, 0.0], [0.0, 6.0]])
+    labels, top = top_contractors(["a", "b", "c", "d"], matrix, 2)
+    assert labels == ["b", "a", "Other (2 contractors, mean)"]
+    np.testing.assert_allclose(top[-1], [4.0, 6.0])
+
+
+def test_legend_lists_every_contractor_once():
+    panel = {"title": "", "x_title": "", "y_title": "", "types": ["t"]}
+    panels = [
+        {**panel, "contractors": ["a", "b", "c"], "matrix": np.array([[1.0], [2.0], [3.0]])},
+        {**panel, "contractors": ["a", "d", "e"], "matrix": np.array([[3.0], [1.0], [2.0]])},
+    ]
+    legend = [trace["name"] for trace in grouped_bar_subplots(panels)["data"] if trace["showlegend"]]
+    assert legend == ["a", "b", "c", "d", "e"]
+    # Contractor d is only charted in the second panel
+    legend = [trace["name"] for trace in grouped_bar_subplots(panels, top_n=1)["data"] if trace["showlegend"]]
+    assert legend == ["a", "Other (2 contractors, mean)", "d"]
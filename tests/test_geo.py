@@ -0,0 +1,82 @@
+import math
+
+import numpy as np
+import pytest
+from munch import Munch
+
+from app.geo import EARTH_RADIUS_KM
+from app.geo import ContractorIndex
+from app.geo import haversine_km
+from app.my_entity_type.controller import PROJECT_LOCATION
+from app.my_folder import controller as my_folder_controller
+from app.my_folder.controller import Controller as MyFolder
+from tests.fake_speckle import FakeViktorAPI
+from tests.fake_speckle import synthetic_children
+
+
+def scalar_haversine_km(lat1, lon1, lat2, lon2) -> float:
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+def random_points(count: int, seed: int = 0) -> tuple[np.ndarray, np.ndarray]:
+    """Points spread over the globe, half of them within a degree of a pole."""
+    rng = np.random.default_rng(seed)
+    lats = np.where(
+        rng.random(count) < 0.5, rng.uniform(-90, 90, count), rng.choice([-1, 1], count) * rng.uniform(89, 90, count)
+    )
+    return lats, rng.uniform(-180, 180, count)
+
+
+def test_haversine_matches_scalar():
+    lats, lons = random_points(200)
+    distances = haversine_km(lats[:, None], lons[:, None], lats[None, :], lons[None, :])
+    expected = [[scalar_haversine_km(*a, *b) for b in zip(lats, lons)] for a in zip(lats, lons)]
+    np.testing.assert_allclose(distances, expected, atol=1e-6)
+    # Madrid to Barcelona
+    assert haversine_km(40.4168, -3.7038, 41.3874, 2.1686) == pytest.approx(505, abs=1)
+
+
+@pytest.mark.parametrize("radius_km", [10, 150, 1000, 5000])
+def test_within_matches_brute_force(radius_km):
+    lats, lons = random_points(2000)
+    index = ContractorIndex([f"Contractor {i}" for i in range(len(lats))], lats, lons)
+    for lat, lon in zip(*random_points(50, seed=1)):
+        positions, distances = index.within(lat, lon, radius_km)
+        brute_force = haversine_km(lat, lon, index.lats, index.lons)
+        assert sorted(positions.tolist()) == np.flatnonzero(brute_force <= radius_km).tolist()
+        assert np.all(np.diff(distances) >= 0)
+        np.testing.assert_allclose(distances, brute_force[positions])
+
+
+def test_nearest():
+    lats, lons = random_points(500)
+    index = ContractorIndex([f"Contractor {i}" for i in range(len(lats))], lats, lons)
+    brute_force = sorted(
+        (scalar_haversine_km(10, 20, lat, lon), f"Contractor {i}") for i, (lat, lon) in enumerate(zip(lats, lons))
+    )
+    nearest = index.nearest(10, 20, k=5)
+    assert [name for name, _ in nearest] == [name for _, name in brute_force[:5]]
+    assert [distance for _, distance in nearest] == pytest.approx([distance for distance, _ in brute_force[:5]])
+    within = index.nearest(10, 20, k=5, radius_km=brute_force[2][0])
+    assert [name for name, _ in within] == [name for _, name in brute_force[:3]]
+
+
+def test_contractor_distances_view(monkeypatch):
+    children = synthetic_children(60, [], [])
+    monkeypatch.setattr(my_folder_controller, "API", lambda: FakeViktorAPI(children))
+    params = Munch(max_distance=500, transport_cost_per_km=2)
+    ranking = MyFolder.contractor_distances(MyFolder(), params=params, entity_id=1).data._serialize()
+    expected = sorted(
+        (
+            scalar_haversine_km(PROJECT_LOCATION.lat, PROJECT_LOCATION.lon, location.lat, location.lon),
+            child.name,
+        )
+        for child in children
+        for location in [child.last_saved_params.constructor_location]
+    )
+    expected = [(distance, name) for distance, name in expected if distance <= 500]
+    assert [item["label"] for item in ranking] == [name for _, name in expected]
+    assert [item["value"] for item in ranking] == [f"{distance:.0f}" for distance, _ in expected]
+    assert ranking[0]["children"][0]["value"] == f"{expected[0][0] * 2:.0f}"
@@ -0,0 +1,109 @@
+import ifcopenshell
+import ifcopenshell.api
+import numpy as np
+import pytest
+
+from app import ifc_quantities
+from app import speckle_functions
+from app.ifc_quantities import get_ifc_snapshot
+from app.ifc_quantities import mesh_volume
+from app.ifc_quantities import quantity_volume
+from tests.conftest import TYPE_COUNT
+from tests.fake_speckle import type_names
+
+# Vertices and triangles of a closed unit cube, two triangles per face
+CUBE_VERTS = [0, 0, 0, 1, 0, 0, 1, 1, 0, 0, 1, 0, 0, 0, 1, 1, 0, 1, 1, 1, 1, 0, 1, 1]
+CUBE_FACES = [
+    *(0, 2, 1, 0, 3, 2),  # bottom
+    *(4, 5, 6, 4, 6, 7),  # top
+    *(0, 1, 5, 0, 5, 4),  # front
+    *(1, 2, 6, 1, 6, 5),  # right
+    *(2, 3, 7, 2, 7, 6),  # back
+    *(3, 0, 4, 3, 4, 7),  # left
+]
+
+
+def add_wall(ifc_file, site, body, wall_type, material, position: int, net_volume: float | None = None):
+    """A 3 × 1 × 1 m wall, with its volume as base quantity when `net_volume` is given, else as geometry only."""
+    wall = ifcopenshell.api.run("root.create_entity", ifc_file, ifc_class="IfcWall")
+    ifcopenshell.api.run("type.assign_type", ifc_file, related_objects=[wall], relating_type=wall_type)
+    ifcopenshell.api.run("material.assign_material", ifc_file, products=[wall], material=material)
+    ifcopenshell.api.run("spatial.assign_container", ifc_file, relating_structure=site, products=[wall])
+    placement = np.eye(4)
+    placement[0, 3] = 5 * position
+    ifcopenshell.api.run("geometry.edit_object_placement", ifc_file, product=wall, matrix=placement)
+    if net_volume is not None:
+        qto = ifcopenshell.api.run("pset.add_qto", ifc_file, product=wall, name="Qto_WallBaseQuantities")
+        ifcopenshell.api.run("pset.edit_qto", ifc_file, qto=qto, properties={"NetVolume": net_volume})
+    else:
+        representation = ifcopenshell.api.run(
+            "geometry.add_wall_representation", ifc_file, context=body, length=3.0, height=1.0, thickness=1.0
+        )
+        ifcopenshell.api.run("geometry.assign_representation", ifc_file, product=wall, representation=representation)
+    return wall
+
+
+@pytest.fixture
+def ifc_path(tmp_path) -> str:
+    """Three concrete walls, one with base quantities and two with geometry only, a steel wall and three lights."""
+    ifc_file = ifcopenshell.api.run("project.create_file", version="IFC4")
+    project = ifcopenshell.api.run("root.create_entity", ifc_file, ifc_class="IfcProject", name="Take-off")
+    ifcopenshell.api.run("unit.assign_unit", ifc_file)
+    model = ifcopenshell.api.run("context.add_context", ifc_file, context_type="Model")
+    body = ifcopenshell.api.run(
+        "context.add_context",
+        ifc_file,
+        context_type="Model",
+        context_identifier="Body",
+        target_view="MODEL_VIEW",
+        parent=model,
+    )
+    site = ifcopenshell.api.run("root.create_entity", ifc_file, ifc_class="IfcSite")
+    ifcopenshell.api.run("aggregate.assign_object", ifc_file, relating_object=project, products=[site])
+    concrete = ifcopenshell.api.run("material.add_material", ifc_file, name="Concrete C30/37")
+    steel = ifcopenshell.api.run("material.add_material", ifc_file, name="Steel S355")
+    wall_type = ifcopenshell.api.run("root.create_entity", ifc_file, ifc_class="IfcWallType", name="Wall C30")
+    add_wall(ifc_file, site, body, wall_type, concrete, 0, net_volume=3.0)
+    add_wall(ifc_file, site, body, wall_type, concrete, 1)
+    add_wall(ifc_file, site, body, wall_type, concrete, 2)
+    add_wall(ifc_file, site, body, wall_type, steel, 3)
+    for _ in range(3):
+        ifcopenshell.api.run("root.create_entity", ifc_file, ifc_class="IfcLightFixture", name="Downlight")
+    path = str(tmp_path / "model.ifc")
+    ifc_file.write(path)
+    return path
+
+
+def test_mesh_volume():
+    assert mesh_volume(CUBE_VERTS, CUBE_FACES) == pytest.approx(1.0)
+    assert mesh_volume(np.asarray(CUBE_VERTS) * 2, CUBE_FACES) == pytest.approx(8.0)
+
+
+def test_take_off(ifc_path, monkeypatch):
+    tessellated = []
+    geometry_volumes = ifc_quantities.geometry_volumes
+
+    def record_geometry_volumes(ifc_file, elements, *args):
+        tessellated.extend(quantity_volume(element) for element in elements)
+        return geometry_volumes(ifc_file, elements, *args)
+
+    monkeypatch.setattr(ifc_quantities, "geometry_volumes", record_geometry_volumes)
+    concrete = get_ifc_snapshot(ifc_path, "concrete")
+    lighting = get_ifc_snapshot(ifc_path, "lighting")
+    assert concrete.totals("volume").to_dict() == {"Wall C30": pytest.approx(9.0)}
+    assert concrete.totals("count").to_dict() == {"Wall C30": 3}
+    assert lighting.totals("count").to_dict() == {"Downlight": 3}
+    # Only the walls without base quantities are tessellated
+    assert tessellated == [None, None]
+
+
+def test_push_with_ifc_model_keeps_unbid_meshes(fake_speckle, ifc_path, monkeypatch):
+    type_0, type_1 = type_names("concrete", TYPE_COUNT)[:2]
+    speckle_functions.push_prices_to_speckle("concrete", {type_0: {"a": 100.0}, type_1: {"a": 100.0}})
+    monkeypatch.setattr(speckle_functions, "IFC_MODEL_PATH", ifc_path)
+    # Bids on IFC type names only reprice the meshes they name
+    speckle_functions.push_prices_to_speckle("concrete", {type_0: {"a": 120.0}, "Wall C30": {"a": 90.0}})
+    model = speckle_functions.receive_object(speckle_functions.get_latest_object_id("concrete"))
+    meshes = [mesh for group in model["@Concrete"].__dict__.values() if isinstance(group, list) for mesh in group]
+    assert {mesh["prices"]["a"] for mesh in meshes if mesh["Name"] == type_0} == {120.0}
+    assert {mesh["prices"]["a"] for mesh in meshes if mesh["Name"] == type_1} == {100.0}
@@ -0,0 +1,32 @@
+import os
+import threading
+
+import numpy as np
+
+from app.quantity_summary import QuantitySummary
+from app.quantity_summary import SummaryStore
+
+
+def test_concurrent_puts_of_the_same_summary(tmp_path):
+    store = SummaryStore(base_path=str(tmp_path))
+    summary = QuantitySummary("concrete", "abc", ["Concrete type 0", "Concrete type 1"], [1.5, 2.5], [1, 2])
+    barrier = threading.Barrier(8)
+    errors = []
+
+    def put():
+        barrier.wait()
+        try:
+            for _ in range(20):
+                store.put(summary)
+        except Exception as error:
+            errors.append(error)
+
+    threads = [threading.Thread(target=put) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    assert os.listdir(store.directory) == ["concrete-abc.npz"]
+    loaded = QuantitySummary.load(store.path("concrete", "abc"), "concrete", "abc")
+    np.testing.assert_array_equal(loaded.volumes, summary.volumes)
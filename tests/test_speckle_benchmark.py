@@ -0,0 +1,265 @@
+import json
+import tracemalloc
+
+import pandas as pd
+import pytest
+from munch import Munch
+from viktor.geometry import GeoPoint
+
+from app import speckle_functions
+from app.categories import CATEGORIES
+from app.model_snapshot import ModelSnapshot
+from app.my_entity_type.controller import Controller as MyEntityType
+from app.my_folder import controller as my_folder_controller
+from app.my_folder.controller import Controller as MyFolder
+from app.quantity_summary import QuantitySummary
+from tests.conftest import CONTRACTOR_COUNT
+from tests.conftest import MODEL_SIZE
+from tests.conftest import TYPE_COUNT
+from tests.fake_speckle import FakeServerTransport
+from tests.fake_speckle import FakeViktorAPI
+from tests.fake_speckle import synthetic_children
+from tests.fake_speckle import synthetic_model
+from tests.fake_speckle import type_names
+
+
+def record_peak_memory(benchmark, function, setup=None):
+    """Run `function` once more under tracemalloc and store its peak allocation with the benchmark results."""
+    if setup is not None:
+        setup()
+    tracemalloc.start()
+    try:
+        function()
+    finally:
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    benchmark.extra_info["model_size"] = MODEL_SIZE
+    benchmark.extra_info["peak_memory_mb"] = round(peak / 1e6, 3)
+
+
+def receive_concrete():
+    return speckle_functions.receive_object(speckle_functions.get_latest_object_id("concrete"))
+
+
+def test_receive_cold(benchmark, fake_speckle, reset_caches):
+    base = benchmark.pedantic(receive_concrete, setup=reset_caches, rounds=5)
+    record_peak_memory(benchmark, receive_concrete, setup=reset_caches)
+    assert base["@Concrete"] is not None
+
+
+def test_receive_warm(benchmark, fake_speckle):
+    receive_concrete()
+    benchmark(receive_concrete)
+    assert speckle_functions.object_cache.stats.hits > 0
+
+
+def concrete_snapshot():
+    object_id = speckle_functions.get_latest_object_id("concrete")
+    elements = speckle_functions.object_cache.iter_objects(
+        object_id, speckle_functions.new_server_transport, member="@Concrete", attribute="Name"
+    )
+    return ModelSnapshot.from_objects(object_id, elements)
+
+
+def test_flatten(benchmark, fake_speckle):
+    snapshot = benchmark(concrete_snapshot)
+    record_peak_memory(benchmark, concrete_snapshot)
+    assert len(snapshot) == MODEL_SIZE
+
+
+def test_aggregation(benchmark, fake_speckle):
+    snapshot = concrete_snapshot()
+    totals = benchmark(snapshot.totals, "volume")
+    assert totals.sum() == pytest.approx(snapshot.volumes.sum())
+
+
+def test_push(benchmark, fake_speckle):
+    contractors = [f"Contractor {i}" for i in range(CONTRACTOR_COUNT)]
+    rounds = iter(range(1_000_000))
+
+    def push():
+        # Every round changes the prices of one type, like a contractor editing a single bid
+        price = float(next(rounds))
+        prices = {
+            name: {contractor: 100.0 for contractor in contractors} for name in type_names("concrete", TYPE_COUNT)
+        }
+        prices["Concrete type 0"][contractors[0]] = price
+        return speckle_functions.push_prices_to_speckle("concrete", prices)
+
+    commit_id = benchmark.pedantic(push, rounds=5)
+    record_peak_memory(benchmark, push)
+    assert commit_id is not None
+
+
+def test_push_writes_only_changed_prices(fake_speckle):
+    contractors = [f"Contractor {i}" for i in range(CONTRACTOR_COUNT)]
+    prices = {name: {contractor: 100.0 for contractor in contractors} for name in type_names("concrete", TYPE_COUNT)}
+    assert speckle_functions.push_prices_to_speckle("concrete", prices) is not None
+    commit_count, object_ids = len(fake_speckle.branches["concrete"]), set(fake_speckle.objects)
+
+    # Unchanged prices make no commit
+    assert speckle_functions.push_prices_to_speckle("concrete", prices) is None
+    assert len(fake_speckle.branches["concrete"]) == commit_count
+
+    # Only the meshes of the repriced type get new objects, the others keep their object id
+    prices["Concrete type 0"][contractors[0]] = 120.0
+    assert speckle_functions.push_prices_to_speckle("concrete", prices) is not None
+    assert len(fake_speckle.branches["concrete"]) == commit_count + 1
+    new_meshes = [
+        json.loads(fake_speckle.objects[object_id])
+        for object_id in set(fake_speckle.objects) - object_ids
+        if "Name" in json.loads(fake_speckle.objects[object_id])
+    ]
+    repriced = speckle_functions.get_model_snapshot("concrete").elements("Concrete type 0")
+    assert len(new_meshes) == len(repriced) > 0
+    assert {mesh["Name"] for mesh in new_meshes} == {"Concrete type 0"}
+
+
+def test_failed_push_is_retried(fake_speckle, monkeypatch):
+    prices = {name: {"Contractor 0": 100.0} for name in type_names("concrete", TYPE_COUNT)}
+    receive_concrete()
+    new_server_transport = speckle_functions.new_server_transport
+    monkeypatch.setattr(speckle_functions, "new_server_transport", lambda: 1 / 0)
+    with pytest.raises(ZeroDivisionError):
+        speckle_functions.push_prices_to_speckle("concrete", prices)
+    monkeypatch.setattr(speckle_functions, "new_server_transport", new_server_transport)
+    # The prices of the failed push never reached the server, so they are pushed again
+    assert speckle_functions.push_prices_to_speckle("concrete", prices) is not None
+
+
+def test_push_carries_the_summary_over(fake_speckle):
+    contractors = [f"Contractor {i}" for i in range(CONTRACTOR_COUNT)]
+    speckle_functions.get_quantity_summaries()
+    prices = {name: {contractor: 100.0 for contractor in contractors} for name in type_names("concrete", TYPE_COUNT)}
+    speckle_functions.push_prices_to_speckle("concrete", prices)
+    object_id = speckle_functions.get_latest_object_id("concrete")
+    carried = speckle_functions.summary_store.get("concrete", object_id)
+    fresh = QuantitySummary.from_snapshot("concrete", speckle_functions.get_model_snapshot("concrete", object_id))
+    # The repriced meshes are listed by their application id, which the new prices didn't change
+    for name in type_names("concrete", TYPE_COUNT):
+        assert carried.elements(name) == fresh.elements(name)
+    pd.testing.assert_series_equal(carried.totals(), fresh.totals())
+
+
+def test_constructor_location_view(benchmark, fake_speckle, reset_caches):
+    params = Munch(constructor_location=GeoPoint(40.4, -3.7))
+    result = benchmark.pedantic(
+        MyEntityType.constructor_location,
+        args=(MyEntityType(),),
+        kwargs={"params": params},
+        setup=reset_caches,
+        rounds=5,
+    )
+    record_peak_memory(
+        benchmark, lambda: MyEntityType.constructor_location(MyEntityType(), params=params), setup=reset_caches
+    )
+    assert result is not None
+
+
+def test_price_comparison_view(benchmark, children, reset_caches):
+    def view():
+        return MyFolder.price_comparison(MyFolder(), params=Munch(), entity_id=1)
+
+    result = benchmark.pedantic(view, setup=reset_caches, rounds=5)
+    record_peak_memory(benchmark, view, setup=reset_caches)
+    assert result is not None
+
+
+def test_price_comparison_view_warm(benchmark, children):
+    def view():
+        return MyFolder.price_comparison(MyFolder(), params=Munch(), entity_id=1)
+
+    view()
+    result = benchmark(view)
+    assert result is not None
+
+
+def test_price_comparison_view_lists_branches_once(children, monkeypatch):
+    listings = []
+    list_branches = speckle_functions.list_branches
+    monkeypatch.setattr(speckle_functions, "list_branches", lambda: listings.append(1) or list_branches())
+    MyFolder.price_comparison(MyFolder(), params=Munch(), entity_id=1)
+    # The cache key and the figure come from the same listing of the commits
+    assert len(listings) == 1
+
+
+def test_children_are_read_on_the_pool(viktor_api):
+    MyFolder.price_comparison(MyFolder(), params=Munch(), entity_id=1)
+    # The children are requested by the worker that lists them, alongside the model versions
+    assert viktor_api.entity_lists[0].read_by.startswith("app-io")
+
+
+def test_bid_award_view(benchmark, children, reset_caches):
+    params = Munch(transport_cost_per_km=2, max_lead_time=15, max_suppliers=3, require_pre_cast=False)
+
+    def view():
+        return MyFolder.bid_award(MyFolder(), params=params, entity_id=1)
+
+    result = benchmark.pedantic(view, setup=reset_caches, rounds=5)
+    record_peak_memory(benchmark, view, setup=reset_caches)
+    assert result is not None
+
+
+def test_bid_award_view_lists_at_most_100_types(fake_speckle, monkeypatch):
+    concrete_types = type_names("concrete", 150)
+    fake_speckle.commit("concrete", synthetic_model("concrete", MODEL_SIZE, len(concrete_types)))
+    children = synthetic_children(3, concrete_types, type_names("lighting", TYPE_COUNT))
+    monkeypatch.setattr(my_folder_controller, "API", lambda: FakeViktorAPI(children))
+    params = Munch(transport_cost_per_km=0, max_lead_time=None, max_suppliers=None, require_pre_cast=False)
+    result = MyFolder.bid_award(MyFolder(), params=params, entity_id=1).data._serialize()
+    concrete = next(item for item in result if item["label"] == CATEGORIES["concrete"].label)
+    costs = [float(item["children"][0]["value"]) for item in concrete["children"][:-1]]
+    assert len(concrete["children"]) == 100
+    assert costs == sorted(costs, reverse=True)
+    assert concrete["children"][-1]["label"] == f"… {len(concrete_types) - 99} more"
+    assert sum(costs) + float(concrete["children"][-1]["value"]) == pytest.approx(float(concrete["value"]), abs=100)
+    # No bid is delivered in time
+    params.max_lead_time = 0
+    not_awarded = MyFolder.bid_award(MyFolder(), params=params, entity_id=1).data._serialize()[-1]
+    assert not_awarded["value"] == len(concrete_types) + TYPE_COUNT
+    assert len(not_awarded["children"]) == 100
+    assert not_awarded["children"][-1]["label"] == f"… {len(concrete_types) + TYPE_COUNT - 99} more"
+
+
+def test_quantities_from_summaries(benchmark, fake_speckle, reset_caches, monkeypatch):
+    monkeypatch.setattr(speckle_functions, "PUBLISH_SUMMARIES", True)
+    # The first read summarizes the full commits and publishes the summaries
+    full_quantities = speckle_functions.get_quantities()
+    commit_bytes = sum(len(serialized) for serialized in fake_speckle.objects.values())
+
+    reads, downloads, branch_listings, summary_bytes = [], [], [], []
+    get_object = FakeServerTransport.get_object
+    list_branches = fake_speckle.client.branch.list
+    monkeypatch.setattr(FakeServerTransport, "copy_object_and_children", lambda self, id, target: downloads.append(id))
+    monkeypatch.setattr(
+        FakeServerTransport,
+        "get_object",
+        lambda self, id: summary_bytes.append(len(get_object(self, id))) or get_object(self, id),
+    )
+    monkeypatch.setattr(
+        fake_speckle.client.branch,
+        "list",
+        lambda *args, **kwargs: branch_listings.append(1) or list_branches(*args, **kwargs),
+    )
+    quantities = benchmark.pedantic(
+        lambda: reads.append(1) or speckle_functions.get_quantities(), setup=reset_caches, rounds=5
+    )
+    benchmark.extra_info["commit_kb"] = round(commit_bytes / 1000, 1)
+    benchmark.extra_info["summary_kb"] = round(sum(summary_bytes) / len(branch_listings) / 1000, 1)
+    assert set(quantities) == set(CATEGORIES)
+    for name in CATEGORIES:
+        assert quantities[name].sort_index().to_numpy() == pytest.approx(full_quantities[name].sort_index().to_numpy())
+    # Fresh processes read only the summaries, with one branch listing for all categories
+    assert not downloads
+    assert len(branch_listings) == len(reads)
+
+
+def test_poller_warms_new_commits(benchmark, fake_speckle, monkeypatch):
+    speckle_functions.poller.poll()
+    # Once a new commit is polled, the first view after it doesn't receive or aggregate anything
+    fake_speckle.commit("concrete", synthetic_model("concrete", MODEL_SIZE, TYPE_COUNT, seed=2))
+    changed = speckle_functions.poller.poll()
+    monkeypatch.setattr(speckle_functions, "get_model_snapshot", None)
+    quantities = benchmark(speckle_functions.get_quantities)
+    assert list(changed) == ["concrete"]
+    assert quantities["concrete"].sum() > 0
@@ -0,0 +1,64 @@
+import os
+
+from app.speckle_cache import SpeckleObjectCache
+from tests.fake_speckle import FakeSpeckleServer
+from tests.fake_speckle import synthetic_model
+
+
+def commit_models(server: FakeSpeckleServer, count: int) -> list[str]:
+    object_ids = []
+    for seed in range(count):
+        server.commit("concrete", synthetic_model("concrete", 500, seed=seed))
+        object_ids.append(server.get_branch(server.stream_id, "concrete", 1).commits.items[0].referencedObject)
+    return object_ids
+
+
+def read_meshes(cache: SpeckleObjectCache, server: FakeSpeckleServer, object_id: str):
+    return cache.iter_objects(object_id, server.transport, member="@Concrete", attribute="Name")
+
+
+def stored(cache: SpeckleObjectCache, object_id: str) -> bool:
+    local_transport = cache.open_local_transport()
+    try:
+        return local_transport.get_object(object_id) is not None
+    finally:
+        local_transport.close()
+
+
+def test_disk_limit_evicts_least_recently_used(tmp_path):
+    server = FakeSpeckleServer()
+    object_ids = commit_models(server, 4)
+    cache = SpeckleObjectCache(max_disk_mb=0.4, base_path=str(tmp_path))
+    for object_id in object_ids:
+        assert len(list(read_meshes(cache, server, object_id))) == 500
+    # The oldest commits made room for the newest, the database itself was kept
+    assert os.path.exists(tmp_path / "Objects.db")
+    assert cache.stats.evictions > 0
+    assert not stored(cache, object_ids[0])
+    assert stored(cache, object_ids[-1])
+    # An evicted commit is simply downloaded again
+    assert len(list(read_meshes(cache, server, object_ids[0]))) == 500
+
+
+def test_disk_limit_keeps_objects_being_read(tmp_path):
+    server = FakeSpeckleServer()
+    object_ids = commit_models(server, 4)
+    cache = SpeckleObjectCache(max_disk_mb=0.4, base_path=str(tmp_path))
+    reading = read_meshes(cache, server, object_ids[0])
+    next(reading)
+    for object_id in object_ids[1:]:
+        list(read_meshes(cache, server, object_id))
+    assert cache.stats.evictions > 0
+    assert len(list(reading)) == 499
+
+
+def test_stats_count_local_reads(tmp_path):
+    server = FakeSpeckleServer()
+    (object_id,) = commit_models(server, 1)
+    cache = SpeckleObjectCache(base_path=str(tmp_path))
+    list(read_meshes(cache, server, object_id))
+    list(read_meshes(cache, server, object_id))
+    # The second read is served from the local database, the receive from it and then from memory
+    cache.receive(object_id, server.transport)
+    cache.receive(object_id, server.transport)
+    assert (cache.stats.hits, cache.stats.misses) == (3, 1)
@@ -0,0 +1,118 @@
+import gzip
+import json
+import threading
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+from types import SimpleNamespace
+from urllib.parse import parse_qs
+
+import pytest
+from specklepy.api import operations
+from specklepy.transports.memory import MemoryTransport
+from urllib3.util.retry import Retry
+
+from app.speckle_transport import TransportPool
+from tests.fake_speckle import FakeSpeckleServer
+from tests.fake_speckle import synthetic_model
+
+STREAM_ID = "stream"
+
+
+class SpeckleHTTPStub(BaseHTTPRequestHandler):
+    """The object endpoints of a Speckle server, over keep-alive HTTP, answering `failures` requests with a 503 first."""
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        # /objects/<stream>/<id>/single
+        self.respond(self.server.objects[self.path.split("/")[3]])
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        with self.server.lock:
+            self.server.bytes_posted += len(body)
+        if self.path.startswith("/api/getobjects/"):
+            object_ids = json.loads(parse_qs(body.decode())["objects"][0])
+            self.respond("\n".join(f"{object_id}\t{self.server.objects[object_id]}" for object_id in object_ids))
+        elif self.path.startswith("/api/diff/"):
+            object_ids = json.loads(parse_qs(body.decode())["objects"][0])
+            self.respond(json.dumps({object_id: object_id in self.server.objects for object_id in object_ids}))
+        else:
+            # A multipart upload of one gzipped JSON array of objects
+            part = body.split(b"\r\n\r\n", 1)[1].rsplit(b"\r\n--", 1)[0]
+            for obj in json.loads(gzip.decompress(part)):
+                self.server.objects[obj["id"]] = json.dumps(obj)
+            self.respond("", status=201)
+
+    def respond(self, text: str, status: int = 200):
+        with self.server.lock:
+            self.server.requests.append(self.path)
+            if self.server.failures:
+                self.server.failures -= 1
+                status, text = 503, "unavailable"
+        content = text.encode()
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+
+@pytest.fixture
+def http_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), SpeckleHTTPStub)
+    server.objects, server.requests, server.failures, server.bytes_posted = {}, [], 0, 0
+    server.lock = threading.Lock()
+    # Seed the stub with a serialized commit
+    fake = FakeSpeckleServer()
+    fake.commit("concrete", synthetic_model("concrete", 50))
+    server.objects.update(fake.objects)
+    server.root_id = fake.get_branch(fake.stream_id, "concrete").commits.items[0].referencedObject
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def pool() -> TransportPool:
+    return TransportPool(retries=Retry(total=3, backoff_factor=0.01, status_forcelist=(503,), allowed_methods=None))
+
+
+def stub_client(server) -> SimpleNamespace:
+    return SimpleNamespace(url=f"http://127.0.0.1:{server.server_port}", account=SimpleNamespace(token="token"))
+
+
+def test_session_is_shared_across_transports(http_server, pool):
+    client = stub_client(http_server)
+    first, second = pool.transport(client, STREAM_ID), pool.transport(client, STREAM_ID)
+    first.copy_object_and_children(http_server.root_id, MemoryTransport())
+    second.copy_object_and_children(http_server.root_id, MemoryTransport())
+    assert first.session is second.session
+    stats = pool.stats
+    assert stats.requests == len(http_server.requests) == 4
+    assert stats.connections_opened == 1
+    assert stats.connections_reused == 3
+
+
+def test_unavailable_server_is_retried(http_server, pool):
+    http_server.failures = 1
+    root = pool.transport(stub_client(http_server), STREAM_ID).get_object(http_server.root_id)
+    assert json.loads(root)["id"] == http_server.root_id
+    assert len(http_server.requests) == 2
+
+
+def test_transfer_counters(http_server, pool):
+    transport = pool.transport(stub_client(http_server), STREAM_ID)
+    target = MemoryTransport()
+    transport.copy_object_and_children(http_server.root_id, target)
+    assert pool.stats.bytes_received == sum(len(serialized) for serialized in target.objects.values())
+
+    object_id = operations.send(synthetic_model("lighting", 20), transports=[transport], use_default_cache=False)
+    assert object_id in http_server.objects
+    # The bodies of the diff and upload requests of every batch
+    assert pool.stats.bytes_sent == http_server.bytes_posted > 0
+    assert pool.stats.requests == len(http_server.requests)
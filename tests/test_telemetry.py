@@ -0,0 +1,42 @@
+import json
+
+from munch import Munch
+
+from app.my_folder import controller as my_folder_controller
+from app.my_folder.controller import Controller as MyFolder
+from app.telemetry import Telemetry
+from app.telemetry import telemetry
+from tests.fake_speckle import FakeViktorAPI
+
+
+def test_metrics_export(benchmark, children, reset_caches):
+    telemetry.reset()
+    MyFolder.price_comparison(MyFolder(), params=Munch(), entity_id=1)
+    MyFolder.price_comparison(MyFolder(), params=Munch(), entity_id=1)
+    prometheus = benchmark(telemetry.export_prometheus)
+    spans = {span["name"] for span in json.loads(telemetry.export_json())["spans"]}
+    assert 'viktor_app_view_duration_seconds_count{view="price_comparison"} 2' in prometheus
+    assert 'viktor_app_view_cache_hits_total{view="price_comparison"} 1' in prometheus
+    assert {"viktor.get_entity_children", "aggregate.snapshot", "plotly.serialize"} <= spans
+
+
+def test_entity_children_span_times_the_read(children, monkeypatch):
+    api = FakeViktorAPI(children, delay=0.05)
+    monkeypatch.setattr(my_folder_controller, "API", lambda: api)
+    telemetry.reset()
+    MyFolder.get_entity_children(1)
+    span = next(span for span in telemetry.spans if span["name"] == "viktor.get_entity_children")
+    # The lazy entity list is read inside the span, not after it
+    assert span["start"] <= api.entity_lists[0].read_at <= span["start"] + span["duration"]
+    assert span["duration"] >= api.delay
+
+
+def test_metrics_export_keeps_every_digit():
+    metrics = Telemetry()
+    metrics.count("elements_aggregated_total", 1234567)
+    metrics.observe("transfer_seconds", 0.1234567)
+    metrics.register_gauges("transport", lambda: {"bytes_received": 98765432})
+    prometheus = metrics.export_prometheus()
+    assert "viktor_app_elements_aggregated_total 1234567\n" in prometheus
+    assert "viktor_app_transfer_seconds_sum 0.1234567\n" in prometheus
+    assert "viktor_app_transport_bytes_received 98765432\n" in prometheus